@@ -1,7 +1,14 @@
+import os
 import streamlit as st
 import pandas as pd
-import os
 from supabase import create_client, Client
+from review_history import HISTORY_FILE
+from app_query import TUTTE
+from app_catalog import build_catalogo, catalog_signature
+from search_index import collapse_editions, filter_positions
+from app_grid import render_grid, render_pagination, LIBRI_PER_PAGINA
+from cover_cache import CoverCache, CoverPrefetcher, COVER_CACHE_DIR
+from wishlist_store import SupabaseWishlistBackend, SqliteWishlistBackend, WishlistSync, LOCAL_WISHLIST_FILE
 
 # --- CONFIGURAZIONE PAGINA ---
 st.set_page_config(page_title="Scouting Amazon", layout="wide")
@@ -19,41 +26,31 @@ except Exception as e:
     st.error(f"Errore di connessione a Supabase: {e}")
     supabase = None
 
-# --- FUNZIONI DATABASE ---
-def carica_preferiti_db():
-    if supabase:
-        try:
-            risposta = supabase.table("wishlist").select("asin").execute()
-            return set(r["asin"] for r in risposta.data)
-        except Exception:
-            return set()
-    return set()
-
-def salva_preferito_db(asin):
+# --- WISHLIST CONDIVISA (SCRITTURA DIFFERITA) ---
+# Un solo oggetto per processo: i click aggiornano subito lo stato in memoria e un thread
+# invia inserimenti e cancellazioni a Supabase a blocchi. Senza Supabase si usa un SQLite locale.
+# Se il backend non risponde all'avvio l'oggetto parte vuoto e riprova da solo: resta in cache comunque.
+@st.cache_resource
+def init_wishlist():
     if supabase:
-        try:
-            supabase.table("wishlist").insert({"asin": asin}).execute()
-        except Exception as e:
-            st.toast(f"⚠️ Errore salvataggio nel DB: {e}")
+        backend = SupabaseWishlistBackend(supabase)
+    else:
+        backend = SqliteWishlistBackend(LOCAL_WISHLIST_FILE)
+    return WishlistSync(backend)
 
-def rimuovi_preferito_db(asin):
-    if supabase:
-        try:
-            supabase.table("wishlist").delete().eq("asin", asin).execute()
-        except Exception as e:
-            st.toast(f"⚠️ Errore rimozione dal DB: {e}")
+wishlist = init_wishlist()
 
 def svuota_salvati_db():
-    st.session_state.libri_salvati.clear()
-    if supabase:
-        try:
-            supabase.table("wishlist").delete().neq("asin", "dummy_value").execute()
-        except Exception as e:
-            st.error(f"Errore nello svuotamento: {e}")
+    wishlist.clear()
+    st.session_state.libri_salvati = set()
 
 # --- INIZIALIZZAZIONE MEMORIA GLOBALE ---
-if 'libri_salvati' not in st.session_state:
-    st.session_state.libri_salvati = carica_preferiti_db()
+# Copia dello stato condiviso a ogni rerun: nessuna chiamata al DB
+st.session_state.libri_salvati = wishlist.snapshot()
+if not wishlist.caricato:
+    st.toast(f"⚠️ Preferiti non ancora caricati, nuovo tentativo in corso: {wishlist.ultimo_errore}")
+elif wishlist.ultimo_errore and wishlist.pending():
+    st.toast(f"⚠️ Sincronizzazione preferiti in ritardo: {wishlist.ultimo_errore}")
 
 # Inizializza il limite di libri da mostrare (150 alla volta)
 if 'limite_libri' not in st.session_state:
@@ -64,40 +61,40 @@ if 'filtro_cat' not in st.session_state: st.session_state.filtro_cat = "Tutte"
 if 'filtro_rec' not in st.session_state: st.session_state.filtro_rec = 60
 if 'filtro_ord' not in st.session_state: st.session_state.filtro_ord = "Decrescente (Più recensioni)"
 if 'filtro_salvati' not in st.session_state: st.session_state.filtro_salvati = False
+if 'filtro_ricerca' not in st.session_state: st.session_state.filtro_ricerca = ""
+if 'pagina' not in st.session_state: st.session_state.pagina = 0
 
 # Funzione callback per il pulsante "Cuore"
 def toggle_salvataggio(asin):
-    if asin in st.session_state.libri_salvati:
-        st.session_state.libri_salvati.remove(asin)
-        rimuovi_preferito_db(asin)
-    else:
+    if wishlist.toggle(asin):
         st.session_state.libri_salvati.add(asin)
-        salva_preferito_db(asin)
+    else:
+        st.session_state.libri_salvati.discard(asin)
+
+# --- CACHE LOCALE DELLE COPERTINE ---
+# Condivisa tra le sessioni: le miniature già scaricate (anche dallo scraper con --covers)
+# si servono dal disco invece che dal CDN di Amazon
+@st.cache_resource
+def init_copertine():
+    return CoverPrefetcher(CoverCache(os.path.join(os.path.dirname(os.path.abspath(__file__)), COVER_CACHE_DIR)))
 
 # --- FUNZIONE DI CARICAMENTO DATI ---
-@st.cache_data(ttl=3600)
-def load_amazon_data(file_name):
-    if not os.path.exists(file_name):
-        return None
-    try:
-        df = pd.read_csv(file_name)
-        df['Titolo'] = df['Titolo'].fillna("Senza Titolo")
-        df['Autore'] = df['Autore'].fillna("N/D")
-        
-        # --- RIMOZIONE DUPLICATI ---
-        df = df.drop_duplicates(subset=['ASIN'])
-        df = df.drop_duplicates(subset=['Titolo'])
-        
-        return df
-    except Exception:
-        return None
+# cache_resource: un unico oggetto condiviso tra sessioni e rerun, senza copie del DataFrame.
+# La firma (dimensione e mtime di CSV e storico) fa parte della chiave: il catalogo si ricarica
+# appena lo scraper scrive dati nuovi, e mai senza motivo. Si tiene solo l'ultima versione.
+@st.cache_resource(max_entries=1)
+def load_catalogo(file_name, history_file, firma):
+    """Dataset (con la crescita, se c'è lo storico) e indici di filtro/ordinamento e ricerca, costruiti una volta."""
+    return build_catalogo(file_name, history_file)
 
 # --- INTESTAZIONE SHOP ---
 st.title("I più venduti - Amazon")
 st.caption("Esplora i libri con più recensioni e aggiungili ai Salvati.")
 
 file_amazon = "amazon_libri_multicat.csv"
-df_amz = load_amazon_data(file_amazon)
+df_amz, indice_amz, indice_testo, info_catalogo = load_catalogo(
+    file_amazon, HISTORY_FILE, catalog_signature(file_amazon, HISTORY_FILE))
+ha_crescita = df_amz is not None and 'Crescita' in df_amz.columns
 
 if df_amz is None:
     st.warning("⚠️ Dati Amazon non ancora disponibili. Attendi che lo scraper generi il file CSV.")
@@ -106,22 +103,28 @@ else:
     # SIDEBAR: FILTRI E SALVATI
     # ==========================================
     st.sidebar.header("Menu")
+
+    ricerca = st.sidebar.text_input("🔎 Cerca titolo o autore:", placeholder="es. Barbero, Nerone...").strip()
     
-    categorie_disponibili = ["Tutte"] + sorted(df_amz['Categoria'].unique().tolist())
+    categorie_disponibili = [TUTTE] + indice_amz.categorie
     sel_cat_amz = st.sidebar.selectbox("Reparto:", categorie_disponibili)
     
-    max_recensioni = int(df_amz['Recensioni'].max()) if not df_amz.empty else 1000
+    max_recensioni = indice_amz.max_recensioni if not df_amz.empty else 1000
     min_recensioni_filtro = st.sidebar.slider(
         "Filtra per popolarità (min. recensioni):", 
         min_value=0, max_value=max_recensioni, value=60, step=50
     )
     
     # NUOVO FILTRO: ORDINAMENTO
+    opzioni_ordinamento = ["Decrescente (Più recensioni)", "Crescente (Meno recensioni)"]
+    if ha_crescita:
+        opzioni_ordinamento.append("Crescita (Recensioni al giorno)")
     ordinamento = st.sidebar.radio(
         "Ordina per recensioni:",
-        options=["Decrescente (Più recensioni)", "Crescente (Meno recensioni)"]
+        options=opzioni_ordinamento
     )
     is_ascending = True if ordinamento == "Crescente (Meno recensioni)" else False
+    colonna_ordinamento = 'Crescita' if ordinamento == "Crescita (Recensioni al giorno)" else 'Recensioni'
 
     st.sidebar.markdown("---")
     
@@ -133,116 +136,158 @@ else:
     if num_salvati > 0:
         st.sidebar.button("🗑️ Svuota Salvati", on_click=svuota_salvati_db, type="secondary")
 
+    st.sidebar.markdown("---")
+    # Griglia rapida: un solo componente per pagina; Classica: un widget Streamlit per ogni libro
+    vista = st.sidebar.radio("Visualizzazione:", options=["Griglia rapida (a pagine)", "Classica"])
+    vista_rapida = vista == "Griglia rapida (a pagine)"
+    # Edizioni diverse dello stesso libro (titoli quasi uguali, stesso autore): ne resta una sola.
+    # Disattivato di default: il catalogo si vede per intero finché l'utente non sceglie di raggrupparlo
+    raggruppa_edizioni = st.sidebar.checkbox("Raggruppa edizioni simili", value=False)
+    # Riempita dopo ricerca e raggruppamento: l'indice di ricerca si costruisce al primo uso
+    didascalia_catalogo = st.sidebar.empty()
+
     # ==========================================
     # CONTROLLO CAMBIO FILTRI
     # ==========================================
     if (sel_cat_amz != st.session_state.filtro_cat or 
         min_recensioni_filtro != st.session_state.filtro_rec or 
         ordinamento != st.session_state.filtro_ord or
-        mostra_solo_salvati != st.session_state.filtro_salvati):
+        mostra_solo_salvati != st.session_state.filtro_salvati or
+        ricerca != st.session_state.filtro_ricerca):
         
         st.session_state.limite_libri = 150
+        st.session_state.pagina = 0
         st.session_state.filtro_cat = sel_cat_amz
         st.session_state.filtro_rec = min_recensioni_filtro
         st.session_state.filtro_ord = ordinamento
         st.session_state.filtro_salvati = mostra_solo_salvati
+        st.session_state.filtro_ricerca = ricerca
 
     # ==========================================
-    # ELABORAZIONE DATI (FILTRI)
+    # ELABORAZIONE DATI (FILTRI E ORDINAMENTO DAGLI INDICI)
     # ==========================================
-    df_filtrato = df_amz.copy()
-    
+    # Nessuna copia né riordino del dataset: l'indice restituisce le posizioni già ordinate
+    # (risultato memorizzato per ogni combinazione di filtri)
+    salvati_set = None
     if mostra_solo_salvati:
         salvati_set = st.session_state.libri_salvati if isinstance(st.session_state.libri_salvati, set) else set()
-        df_filtrato = df_filtrato[df_filtrato['ASIN'].isin(salvati_set)]
-    else:
-        if sel_cat_amz != "Tutte":
-            df_filtrato = df_filtrato[df_filtrato['Categoria'] == sel_cat_amz]
-        df_filtrato = df_filtrato[df_filtrato['Recensioni'] >= min_recensioni_filtro]
-        
-    # APPLICAZIONE ORDINAMENTO SCELTO DALL'UTENTE
-    df_filtrato = df_filtrato.sort_values(by='Recensioni', ascending=is_ascending)
+    posizioni = indice_amz.query(
+        category=sel_cat_amz,
+        min_reviews=min_recensioni_filtro,
+        ascending=is_ascending,
+        sort_by=colonna_ordinamento,
+        saved=salvati_set
+    )
+    # Ricerca e raggruppamento restringono il risultato senza cambiarne l'ordine
+    if ricerca:
+        posizioni = filter_positions(posizioni, indice_testo.search(ricerca))
+    if raggruppa_edizioni:
+        posizioni = collapse_editions(posizioni, indice_testo.edition_ids())
 
-    totale_libri = len(df_filtrato)
+    indici_mb = info_catalogo['indici_mb'] + indice_testo.nbytes / 1024 ** 2
+    didascalia_catalogo.caption(
+        f"📦 Catalogo: {info_catalogo['righe']} libri, "
+        f"{info_catalogo['memoria_mb'] - info_catalogo['indici_mb'] + indici_mb:.2f} MB in memoria "
+        f"(di cui {indici_mb:.2f} MB di indici, +{info_catalogo['mappati_mb']:.1f} MB su disco), "
+        f"caricato in {info_catalogo['secondi']:.2f} s"
+    )
+
+    totale_libri = len(posizioni)
     st.markdown(f"**{totale_libri}** risultati trovati")
     st.markdown("---")
 
-    df_mostrato = df_filtrato.iloc[:st.session_state.limite_libri]
+    salvati_correnti = st.session_state.libri_salvati if isinstance(st.session_state.libri_salvati, set) else set()
 
-    # ==========================================
-    # RENDERING A GRIGLIA ALLINEATA
-    # ==========================================
-    lista_libri = list(df_mostrato.iterrows())
+    if vista_rapida:
+        # ==========================================
+        # GRIGLIA RAPIDA CON PAGINAZIONE
+        # ==========================================
+        pagina = render_pagination(totale_libri)
+        inizio = pagina * LIBRI_PER_PAGINA
+        df_pagina = indice_amz.page(posizioni[inizio:], LIBRI_PER_PAGINA)
+        # Prefetch: le copertine della pagina successiva si scaricano mentre si guarda questa
+        df_successiva = indice_amz.page(posizioni[inizio + LIBRI_PER_PAGINA:], LIBRI_PER_PAGINA)
+        render_grid(df_pagina, salvati_correnti, toggle_salvataggio, ha_crescita,
+                    covers=init_copertine(), prefetch_urls=df_successiva['Copertina'].tolist())
+    else:
+        df_mostrato = indice_amz.page(posizioni, st.session_state.limite_libri)
+
+        # ==========================================
+        # RENDERING A GRIGLIA ALLINEATA
+        # ==========================================
+        lista_libri = list(df_mostrato.iterrows())
     
-    for i in range(0, len(lista_libri), 3):
-        cols = st.columns(3)
+        for i in range(0, len(lista_libri), 3):
+            cols = st.columns(3)
         
-        for j in range(3):
-            if i + j < len(lista_libri):
-                index, row_data = lista_libri[i + j]
-                asin = row_data.get('ASIN', '')
+            for j in range(3):
+                if i + j < len(lista_libri):
+                    index, row_data = lista_libri[i + j]
+                    asin = row_data.get('ASIN', '')
                 
-                is_saved = asin in st.session_state.libri_salvati if isinstance(st.session_state.libri_salvati, set) else False
+                    is_saved = asin in st.session_state.libri_salvati if isinstance(st.session_state.libri_salvati, set) else False
                 
-                with cols[j]:
-                    with st.container(border=True):
+                    with cols[j]:
+                        with st.container(border=True):
                         
-                        # 1. RIGA TITOLO E CUORE (Cuore senza riquadro con type="tertiary")
-                        c_titolo, c_cuore = st.columns([5, 1])
-                        with c_cuore:
-                            st.button(
-                                "❤️" if is_saved else "🤍", 
-                                key=f"btn_{asin}", 
-                                on_click=toggle_salvataggio, 
-                                args=(asin,),
-                                help="Aggiungi o rimuovi dai Salvati",
-                                type="tertiary"
-                            )
-                        with c_titolo:
-                            titolo_html = f"""
-                            <div style='height: 55px; padding-top: 4px; overflow: hidden; text-overflow: ellipsis; display: -webkit-box; -webkit-line-clamp: 2; -webkit-box-orient: vertical; font-weight: bold; font-size: 1.05em; text-align: left;'>
-                                {row_data['Titolo']}
-                            </div>
-                            """
-                            st.markdown(titolo_html, unsafe_allow_html=True)
+                            # 1. RIGA TITOLO E CUORE (Cuore senza riquadro con type="tertiary")
+                            c_titolo, c_cuore = st.columns([5, 1])
+                            with c_cuore:
+                                st.button(
+                                    "❤️" if is_saved else "🤍", 
+                                    key=f"btn_{asin}", 
+                                    on_click=toggle_salvataggio, 
+                                    args=(asin,),
+                                    help="Aggiungi o rimuovi dai Salvati",
+                                    type="tertiary"
+                                )
+                            with c_titolo:
+                                titolo_html = f"""
+                                <div style='height: 55px; padding-top: 4px; overflow: hidden; text-overflow: ellipsis; display: -webkit-box; -webkit-line-clamp: 2; -webkit-box-orient: vertical; font-weight: bold; font-size: 1.05em; text-align: left;'>
+                                    {row_data['Titolo']}
+                                </div>
+                                """
+                                st.markdown(titolo_html, unsafe_allow_html=True)
                         
-                        # 2. IMMAGINE (Gigante e centrata)
-                        url = row_data['Copertina']
-                        if pd.notna(url) and str(url).startswith('http'):
-                            img_html = f"""
-                            <div style='height: 450px; display: flex; justify-content: center; align-items: center; margin-bottom: 15px;'>
-                                <img src='{url}' style='width: 100%; height: 100%; object-fit: contain;'>
-                            </div>
-                            """
-                        else:
-                            img_html = f"<div style='height: 450px; display: flex; justify-content: center; align-items: center; margin-bottom: 15px; background-color: #f8f9fa; border-radius: 5px;'>🖼️ <i>Nessuna Immagine</i></div>"
+                            # 2. IMMAGINE (Gigante e centrata)
+                            url = row_data['Copertina']
+                            if pd.notna(url) and str(url).startswith('http'):
+                                img_html = f"""
+                                <div style='height: 450px; display: flex; justify-content: center; align-items: center; margin-bottom: 15px;'>
+                                    <img src='{url}' style='width: 100%; height: 100%; object-fit: contain;'>
+                                </div>
+                                """
+                            else:
+                                img_html = f"<div style='height: 450px; display: flex; justify-content: center; align-items: center; margin-bottom: 15px; background-color: #f8f9fa; border-radius: 5px;'>🖼️ <i>Nessuna Immagine</i></div>"
                         
-                        st.markdown(img_html, unsafe_allow_html=True)
+                            st.markdown(img_html, unsafe_allow_html=True)
                         
-                        # 3. INFO E METADATI (Allineati a sinistra)
-                        autore_intero = str(row_data.get('Autore', 'N/D'))
-                        autore_corto = autore_intero[:35] + "..." if len(autore_intero) > 35 else autore_intero
+                            # 3. INFO E METADATI (Allineati a sinistra)
+                            autore_intero = str(row_data.get('Autore', 'N/D'))
+                            autore_corto = autore_intero[:35] + "..." if len(autore_intero) > 35 else autore_intero
+                            crescita = row_data.get('Crescita', 0.0) if ha_crescita else 0.0
+                            crescita_html = f" · 📈 +{crescita:.1f}/giorno" if crescita > 0 else ""
                         
-                        info_html = f"""
-                        <div style='height: 80px; line-height: 1.4; text-align: left;'>
-                            <span style='font-size: 0.85em; color: gray;'>Di: <b>{autore_corto}</b></span><br>
-                            <span style='font-size: 0.9em;'>⭐⭐⭐⭐⭐ ({int(row_data['Recensioni'])})</span><br>
-                            <span style='font-size: 0.8em; color: gray;'>Reparto: {row_data.get('Categoria', 'N/D')}</span>
-                        </div>
-                        """
-                        st.markdown(info_html, unsafe_allow_html=True)
-
-                        # 4. PULSANTE AMAZON
-                        amz_link = f"https://www.amazon.it/dp/{asin}" if pd.notna(asin) else "#"
-                        st.link_button("Vedi su Amazon", amz_link, type="primary", use_container_width=True)
+                            info_html = f"""
+                            <div style='height: 80px; line-height: 1.4; text-align: left;'>
+                                <span style='font-size: 0.85em; color: gray;'>Di: <b>{autore_corto}</b></span><br>
+                                <span style='font-size: 0.9em;'>⭐⭐⭐⭐⭐ ({int(row_data['Recensioni'])}){crescita_html}</span><br>
+                                <span style='font-size: 0.8em; color: gray;'>Reparto: {row_data.get('Categoria', 'N/D')}</span>
+                            </div>
+                            """
+                            st.markdown(info_html, unsafe_allow_html=True)
 
-    # ==========================================
-    # PULSANTE "CARICA ALTRI" IN FONDO
-    # ==========================================
-    if st.session_state.limite_libri < totale_libri:
-        st.markdown("---")
-        col_vuota1, col_bottone, col_vuota2 = st.columns([1, 2, 1])
-        with col_bottone:
-            if st.button("⬇️ Carica altri libri", use_container_width=True):
-                st.session_state.limite_libri += 150
-                st.rerun()
+                            # 4. PULSANTE AMAZON
+                            amz_link = f"https://www.amazon.it/dp/{asin}" if pd.notna(asin) else "#"
+                            st.link_button("Vedi su Amazon", amz_link, type="primary", use_container_width=True)
+
+        # ==========================================
+        # PULSANTE "CARICA ALTRI" IN FONDO
+        # ==========================================
+        if st.session_state.limite_libri < totale_libri:
+            st.markdown("---")
+            col_vuota1, col_bottone, col_vuota2 = st.columns([1, 2, 1])
+            with col_bottone:
+                if st.button("⬇️ Carica altri libri", use_container_width=True):
+                    st.session_state.limite_libri += 150
+                    st.rerun()
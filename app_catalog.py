@@ -0,0 +1,65 @@
+import os
+import time
+import pandas as pd
+from review_history import read_velocity
+from app_query import BookQueryIndex
+from compact_dataset import clean_dataset, ensure_compact, load_compact, file_signature, memory_mb
+from search_index import TextSearchIndex
+
+# --- CARICAMENTO DEL CATALOGO PER L'APP ---
+# Lettura del dataset (formato compatto Arrow, rigenerato solo quando il CSV cambia), crescita
+# dallo storico e costruzione degli indici. Fuori dal file dell'app così si può usare senza
+# Streamlit (benchmark, script); la cache la gestisce l'app, con catalog_signature come chiave.
+
+
+def load_amazon_data(file_name):
+    if not os.path.exists(file_name):
+        return None
+    try:
+        return clean_dataset(pd.read_csv(file_name))
+    except Exception:
+        return None
+
+def load_review_velocity(file_name):
+    """Vista precalcolata dallo scraper incrementale: recensioni guadagnate al giorno per ASIN."""
+    try:
+        return read_velocity(file_name)[['ASIN', 'Crescita']]
+    except Exception:
+        return None
+
+def catalog_signature(file_name, history_file=None):
+    """Cambia quando cambia il CSV o lo storico: al posto di una scadenza a tempo."""
+    return file_signature(file_name), file_signature(history_file)
+
+def build_catalogo(file_name, history_file=None):
+    """Ritorna (df, indice filtri/ordinamento, indice di ricerca, info), oppure quattro None se il CSV manca.
+
+    Il DataFrame contiene solo ASIN, Recensioni, Categoria (e Crescita); le altre colonne
+    si leggono dal file mappato per le righe di ogni pagina. info riporta memoria (DataFrame e indice
+    dei filtri) e tempo di caricamento; l'indice di ricerca riporta la sua in nbytes una volta costruito.
+    """
+    if not os.path.exists(file_name):
+        return None, None, None, None
+    inizio = time.perf_counter()
+    try:
+        df, lazy = load_compact(ensure_compact(file_name))
+    except Exception:
+        return None, None, None, None
+    df_velocita = load_review_velocity(history_file) if history_file else None
+    if df_velocita is not None and not df_velocita.empty:
+        df = df.merge(df_velocita, on='ASIN', how='left')
+        df['Crescita'] = df['Crescita'].fillna(0.0)
+    df = df.reset_index(drop=True)
+    indice = BookQueryIndex(df, lazy=lazy)
+    # Indice di ricerca/edizioni costruito alla prima ricerca o al primo raggruppamento, leggendo
+    # titoli e autori dal file mappato a blocchi; la sua memoria si aggiunge allora a info
+    testo = TextSearchIndex(source=lambda: (lazy.iter_column('Titolo'), lazy.iter_column('Autore')))
+    indici_mb = indice.nbytes / 1024 ** 2
+    info = {
+        "righe": len(df),
+        "memoria_mb": memory_mb(df) + indici_mb,
+        "indici_mb": indici_mb,
+        "mappati_mb": lazy.nbytes / 1024 ** 2,
+        "secondi": time.perf_counter() - inizio,
+    }
+    return df, indice, testo, info
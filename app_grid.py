@@ -0,0 +1,114 @@
+import os
+import pandas as pd
+import streamlit as st
+import streamlit.components.v1 as components
+
+# --- GRIGLIA LEGGERA DEI RISULTATI ---
+# Un solo componente per pagina di risultati al posto di colonne, container, markdown e
+# pulsanti per ogni libro: il payload contiene solo i campi delle card della pagina corrente,
+# quindi tempo di rerun e dimensione restano costanti al crescere della lista.
+
+LIBRI_PER_PAGINA = 48
+# Cartella servita da Streamlit su /app/static/ (server.enableStaticServing in .streamlit/config.toml)
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+
+_griglia_libri = components.declare_component(
+    "griglia_libri", path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "grid_component")
+)
+
+
+def static_url(path):
+    """URL con cui il browser legge un file sotto STATIC_DIR, o None se il file è altrove."""
+    relativo = os.path.relpath(os.path.abspath(path), STATIC_DIR)
+    if relativo.startswith(".."): return None
+    base = st.get_option("server.baseUrlPath").strip("/")
+    return "/" + "/".join(p for p in (base, "app", "static", relativo.replace(os.sep, "/")) if p)
+
+
+def cover_sources(covers, urls):
+    """Sorgente <img> per ogni copertina: URL statico della miniatura in cache se presente.
+
+    Nel payload finisce solo il percorso, i byte li scarica il browser (e li tiene in cache).
+    Le copertine non ancora in cache restano sull'URL remoto e vengono scaricate in background;
+    quelle note come non valide diventano "" (segnaposto "Nessuna Immagine").
+    """
+    urls = [u for u in urls if isinstance(u, str) and u.startswith('http')]
+    if covers is None: return {}
+    miniature = covers.cache.thumbnail_paths(urls)
+    covers.submit(u for u in urls if u not in miniature)
+    sorgenti = {}
+    for url, path in miniature.items():
+        if path is None:
+            sorgenti[url] = ""
+        elif (sorgente := static_url(path)) is not None:
+            sorgenti[url] = sorgente
+    return sorgenti
+
+
+def card_payload(df_pagina, salvati, ha_crescita=False, copertine=None):
+    """Converte le righe della pagina nei dati (solo testo) che servono alla griglia."""
+    copertine = copertine or {}
+    libri = []
+    for row in df_pagina.itertuples(index=False):
+        asin = row.ASIN
+        autore = str(row.Autore)
+        url = row.Copertina
+        crescita = getattr(row, 'Crescita', 0.0) if ha_crescita else 0.0
+        libri.append({
+            "asin": asin,
+            "titolo": str(row.Titolo),
+            "autore": autore[:35] + "..." if len(autore) > 35 else autore,
+            "copertina": copertine.get(url, url) if pd.notna(url) and str(url).startswith('http') else "",
+            "recensioni": int(row.Recensioni),
+            "extra": f" · 📈 +{crescita:.1f}/giorno" if crescita > 0 else "",
+            "categoria": str(row.Categoria),
+            "link": f"https://www.amazon.it/dp/{asin}" if pd.notna(asin) else "#",
+            "salvato": asin in salvati,
+        })
+    return libri
+
+
+def render_grid(df_pagina, salvati, on_toggle, ha_crescita=False, key="griglia_libri", covers=None,
+                prefetch_urls=()):
+    """Disegna la pagina di card; on_toggle(asin) viene chiamata quando si clicca un cuore.
+
+    Con covers (CoverPrefetcher) le copertine arrivano dalla cache locale e quelle di
+    prefetch_urls (es. la pagina successiva) vengono scaricate in anticipo.
+    """
+    copertine = cover_sources(covers, df_pagina['Copertina'].tolist())
+    if covers is not None:
+        covers.submit(prefetch_urls)
+
+    def _evento_cuore():
+        evento = st.session_state.get(key)
+        if evento and evento.get("asin"):
+            on_toggle(evento["asin"])
+
+    return _griglia_libri(
+        libri=card_payload(df_pagina, salvati, ha_crescita, copertine),
+        key=key,
+        on_change=_evento_cuore,
+        default=None,
+    )
+
+
+def render_pagination(totale, pagina_key="pagina", per_pagina=LIBRI_PER_PAGINA):
+    """Controlli Precedente/Successiva; ritorna la pagina corrente (da 0)."""
+    num_pagine = max(1, -(-totale // per_pagina))
+    pagina = min(st.session_state.get(pagina_key, 0), num_pagine - 1)
+    st.session_state[pagina_key] = pagina
+
+    def _vai(delta):
+        st.session_state[pagina_key] = min(max(0, st.session_state[pagina_key] + delta), num_pagine - 1)
+
+    col_prec, col_info, col_succ = st.columns([1, 2, 1])
+    with col_prec:
+        st.button("⬅️ Precedente", key=f"{pagina_key}_prec", on_click=_vai, args=(-1,),
+                  disabled=pagina == 0, use_container_width=True)
+    with col_info:
+        st.markdown(f"<div style='text-align: center; padding-top: 6px;'>Pagina <b>{pagina + 1}</b> di {num_pagine}</div>",
+                    unsafe_allow_html=True)
+    with col_succ:
+        st.button("Successiva ➡️", key=f"{pagina_key}_succ", on_click=_vai, args=(1,),
+                  disabled=pagina >= num_pagine - 1, use_container_width=True)
+    return pagina
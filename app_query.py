@@ -0,0 +1,88 @@
+import sys
+from functools import lru_cache
+import numpy as np
+
+# --- INDICI DI FILTRO/ORDINAMENTO PER L'APP ---
+# Costruiti una volta per ogni caricamento del dataset. Per ogni reparto (più "Tutte") si
+# tengono le posizioni delle righe già ordinate per recensioni crescenti: il filtro
+# "min. recensioni" diventa una ricerca binaria e l'ordine decrescente una lettura al contrario.
+# I risultati di ogni combinazione di filtri vengono memorizzati.
+
+TUTTE = "Tutte"
+
+
+class BookQueryIndex:
+    def __init__(self, df, cache_size=256, lazy=None):
+        """lazy: colonne pesanti fuori dal DataFrame (LazyColumns), aggiunte solo alle righe di page()."""
+        self.df = df
+        self.lazy = lazy
+        recensioni = df['Recensioni'].to_numpy()
+        self.max_recensioni = int(recensioni.max()) if len(df) else 0
+        self.categorie = sorted(df['Categoria'].dropna().unique().tolist())
+        self.asin_pos = {asin: i for i, asin in enumerate(df['ASIN'].tolist())}
+
+        # Colonne ordinabili: Recensioni sempre, Crescita se lo storico è disponibile
+        self.sort_columns = ['Recensioni'] + (['Crescita'] if 'Crescita' in df.columns else [])
+        self._values = {col: df[col].to_numpy() for col in self.sort_columns}
+
+        categorie = df['Categoria'].to_numpy()
+        gruppi = {TUTTE: np.arange(len(df))}
+        for cat in self.categorie:
+            gruppi[cat] = np.flatnonzero(categorie == cat)
+
+        # {(reparto, colonna): (posizioni ordinate per colonna crescente, recensioni nello stesso ordine)}
+        self._ordinati = {}
+        for cat, righe in gruppi.items():
+            for col in self.sort_columns:
+                ordine = righe[np.argsort(self._values[col][righe], kind='stable')]
+                ordine.flags.writeable = False
+                self._ordinati[(cat, col)] = (ordine, recensioni[ordine])
+
+        self._query = lru_cache(maxsize=cache_size)(self._query_uncached)
+
+    @property
+    def nbytes(self):
+        """Stima della memoria dell'indice oltre al DataFrame: mappa ASIN -> posizione e posizioni ordinate."""
+        # Le chiavi sono stringhe Python create da tolist(), non condivise con le colonne Arrow del DataFrame
+        totale = sys.getsizeof(self.asin_pos)
+        totale += sum(map(sys.getsizeof, self.asin_pos)) + sum(map(sys.getsizeof, self.asin_pos.values()))
+        for ordine, recensioni in self._ordinati.values():
+            totale += ordine.nbytes + recensioni.nbytes
+        return totale
+
+    def query(self, category=TUTTE, min_reviews=0, ascending=False, sort_by='Recensioni', saved=None):
+        """Ritorna le posizioni (iloc) delle righe filtrate e ordinate.
+
+        Con saved (insieme di ASIN) si mostrano solo i Salvati, senza filtro di reparto o recensioni.
+        """
+        if sort_by not in self.sort_columns:
+            sort_by = 'Recensioni'
+        saved_key = frozenset(saved) if saved is not None else None
+        return self._query(category, int(min_reviews), bool(ascending), sort_by, saved_key)
+
+    def clear_cache(self):
+        """Svuota i risultati memorizzati (es. per misurare il costo delle query)."""
+        self._query.cache_clear()
+
+    def _query_uncached(self, category, min_reviews, ascending, sort_by, saved):
+        if saved is not None:
+            righe = np.fromiter((self.asin_pos[a] for a in saved if a in self.asin_pos), dtype=np.intp)
+            risultato = righe[np.argsort(self._values[sort_by][righe], kind='stable')]
+        else:
+            ordine, recensioni = self._ordinati.get((category, sort_by), self._ordinati[(TUTTE, sort_by)])
+            if sort_by == 'Recensioni':
+                # Righe ordinate per recensioni: il filtro è un taglio alla prima posizione valida
+                risultato = ordine[np.searchsorted(recensioni, min_reviews, side='left'):]
+            else:
+                risultato = ordine[recensioni >= min_reviews]
+        if not ascending:
+            risultato = risultato[::-1]
+        return risultato
+
+    def page(self, positions, limit):
+        """Le prime `limit` righe del risultato: costo proporzionale alla pagina, non al dataset."""
+        righe = self.df.iloc[positions[:limit]]
+        if self.lazy is not None:
+            extra = self.lazy.take(positions[:limit])
+            righe = righe.assign(**{col: extra[col].to_numpy() for col in extra.columns})
+        return righe
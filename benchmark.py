@@ -0,0 +1,359 @@
+import os
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import contextlib
+import subprocess
+
+import numpy as np
+import pandas as pd
+
+import scraper_amazon
+from app_catalog import load_amazon_data
+from app_query import BookQueryIndex, TUTTE
+from compact_dataset import ensure_compact, load_compact, memory_mb
+from card_extractor import CardExtractor, available_backends, clean_reviews_count, is_multiple_author, extract_date
+from dataset_store import COLUMNS, SqliteStore, append_to_csv, sort_final_csv
+from search_index import TextSearchIndex
+from snapshot_store import SnapshotStore, DEFAULT_SNAPSHOT_DIR
+
+# --- BENCHMARK OFFLINE ---
+# Misura, senza rete né browser, le parti del progetto che contano per le prestazioni:
+#   estrazione   -> card dalle pagine registrate (snapshot) o sintetiche, per ogni backend
+#   helper       -> extract_date / clean_reviews_count / is_multiple_author
+#   archivio     -> accodamento e riordino del CSV, accodamento SQLite
+#   app          -> load_amazon_data, indici e filtri/ordinamento, ricerca
+# I dataset sintetici (1k / 100k / 1M righe) hanno le stesse colonne di amazon_libri_multicat.csv.
+# Ogni run viene accodato a bench_results.jsonl e confrontato con il precedente:
+#   python benchmark.py                       # tutte le misure
+#   python benchmark.py --sizes 1000,100000   # senza il dataset da 1M
+#   python benchmark.py | tee bench_output.txt
+
+RESULTS_FILE = "bench_results.jsonl"
+DEFAULT_SIZES = (1_000, 100_000, 1_000_000)
+RIGHE_PER_PAGINA = 24
+
+CATEGORIE = [cat['name'] for cat in scraper_amazon.CATEGORIES]
+_MESI = ["gen.", "feb.", "mar.", "apr.", "mag.", "giu.", "lug.", "ago.", "set.", "ott.", "nov.", "dic."]
+_PAROLE = ("storia segreti roma guerra mondo vita donne uomini mare tempo notte libro giorni "
+           "grande piccolo nuovo ultimo primo amore potere impero papa re regina arte scienza "
+           "mente corpo guida manuale metodo cucina viaggio italia europa memorie diario").split()
+_NOMI = ["Alessandro", "Alberto", "Maria", "Giulia", "Luca", "Paolo", "Anna", "Marco", "Elena", "Franco"]
+_COGNOMI = ["Barbero", "Angela", "Rossi", "Bianchi", "Verdi", "Cazzullo", "Eco", "Ferrante", "Galimberti",
+            "Recalcati", "Mancuso", "Vespa", "Augias", "Scurati", "Bortolato"]
+
+
+# --- FIXTURE ---
+def _card_html(asin, rnd):
+    autore = rnd.choice(_COGNOMI)
+    if rnd.random() < 0.2:
+        autore = f"{rnd.choice(_NOMI)} {autore} e {rnd.choice(_NOMI)} {rnd.choice(_COGNOMI)}"
+    else:
+        autore = f"{rnd.choice(_NOMI)} {autore}"
+    recensioni = rnd.choice([5, 45, 61, 120, 1532, 23000])
+    testo = f"{recensioni:,}".replace(",", ".")
+    if rnd.random() < 0.7:
+        review = (f'<a aria-label="{testo} valutazioni" class="a-link-normal" href="#">'
+                  f'<span class="a-size-base s-underline-text">{testo}</span></a>')
+    else:
+        review = f'<span class="a-size-base s-underline-text">{testo}</span>'
+    if rnd.random() < 0.95:
+        riga_autore = (f'<div class="a-row a-size-base a-color-secondary"><span>di </span><a href="#">{autore}</a>'
+                       f'<span> | </span><span>{rnd.randint(1, 28)} {rnd.choice(_MESI)} {rnd.randint(1990, 2025)}</span></div>')
+    else:
+        riga_autore = '<div class="a-row"><span>Copertina flessibile</span></div>'
+    titolo = " ".join(rnd.choice(_PAROLE) for _ in range(rnd.randint(2, 7))).capitalize()
+    return f'''<div data-asin="{asin}" data-component-type="s-search-result" class="s-result-item s-asin">
+ <div class="sg-col-inner"><span class="rush-component"><img class="s-image" src="https://m.media-amazon.com/images/I/{asin}.jpg" alt=""></span>
+ <h2 class="a-size-mini"><a href="#"><span>{titolo}</span></a></h2>
+ {riga_autore}
+ <div class="a-row a-size-small"><span aria-label="4,6 su 5 stelle"><i class="a-icon-star"></i></span>{review}</div>
+ <div class="a-row"><span>Copertina rigida</span> <span class="a-price">€ 18,00</span></div>
+ <script>var s = "di nessuno";</script>
+ </div></div>'''
+
+
+def synthetic_pages(n, seed=0):
+    """Pagine di risultati con la stessa struttura di quelle di Amazon (24 card, paginazione)."""
+    rnd = random.Random(seed)
+    pagine = []
+    for p in range(n):
+        cards = "\n".join(_card_html(f"B0{rnd.randint(0, n * 16):08d}", rnd) for _ in range(RIGHE_PER_PAGINA))
+        nxt = '<a class="s-pagination-item s-pagination-next" href="#">Successivo</a>'
+        pagine.append((CATEGORIE[p % len(CATEGORIE)], p // len(CATEGORIE) + 1,
+                       f'<html><head><title>Amazon.it</title></head><body><div class="s-main-slot">{cards}</div>'
+                       f'<div>{nxt}</div></body></html>'))
+    return pagine
+
+
+def recorded_pages(snapshot_dir, limit):
+    """Pagine registrate con --capture (le prime `limit`); lista vuota se l'archivio non c'è."""
+    if not os.path.isdir(snapshot_dir): return []
+    store = SnapshotStore(snapshot_dir)
+    voci = sorted(store.entries().items())[:limit]
+    return [(cat, page, store.get(digest)) for (cat, page), digest in voci]
+
+
+def synthetic_dataset(rows, seed=0):
+    """DataFrame con le colonne del CSV dello scraper e distribuzioni plausibili."""
+    rng = np.random.default_rng(seed)
+    parole = np.array(_PAROLE)
+    autori = np.array([f"{n} {c}" for n in _NOMI for c in _COGNOMI] + [f"Autore {i}" for i in range(max(1, rows // 20))])
+    lunghezze = rng.integers(2, 7, rows)
+    indici = rng.integers(0, len(parole), (rows, 7))
+    titoli = [" ".join(parole[indici[i, :lunghezze[i]]]).capitalize() + f" {i}" for i in range(rows)]
+    asin = np.char.add("B0", np.char.zfill(np.arange(rows).astype(str), 8))
+    recensioni = np.maximum(60, rng.lognormal(5.5, 1.3, rows)).astype(np.int64)
+    date = [f"{d} {_MESI[m]} {y}" for d, m, y in zip(rng.integers(1, 29, rows), rng.integers(0, 12, rows),
+                                                     rng.integers(1990, 2026, rows))]
+    return pd.DataFrame({
+        'ASIN': asin,
+        'Copertina': np.char.add(np.char.add("https://m.media-amazon.com/images/I/", asin), ".jpg"),
+        'Titolo': titoli,
+        'Autore': autori[rng.integers(0, len(autori), rows)],
+        'Data': date,
+        'Recensioni': recensioni,
+        'Categoria': np.array(CATEGORIE)[rng.integers(0, len(CATEGORIE), rows)],
+    })[COLUMNS]
+
+
+# --- MISURE ---
+def timed(fn, repeat=3):
+    """Il migliore di `repeat` tempi (secondi): meno sensibile al rumore della macchina."""
+    migliore = float("inf")
+    for _ in range(repeat):
+        inizio = time.perf_counter()
+        fn()
+        migliore = min(migliore, time.perf_counter() - inizio)
+    return migliore
+
+
+class _ReplayFetcher:
+    """Fetcher che restituisce le pagine registrate: isola il ciclo di crawl_pages dalla rete."""
+
+    def __init__(self, html_by_url):
+        self.html_by_url = html_by_url
+
+    def fetch_many(self, urls):
+        for url in urls:
+            yield url, self.html_by_url.get(url, "<html></html>")
+
+
+def bench_extraction(pagine, repeat):
+    risultati = {}
+    for nome in available_backends():
+        extractor = CardExtractor(nome)
+        secondi = timed(lambda: [extractor.extract(html, cat) for cat, _, html in pagine], repeat)
+        risultati[f"estrazione/{nome} ms/pagina"] = secondi / len(pagine) * 1000
+
+    # Ciclo interno di get_amazon_data (crawl_pages) senza fetch: estrazione, deduplica, scrittura
+    per_categoria = {}
+    for cat, page, html in pagine:
+        per_categoria.setdefault(cat, {})[page] = html
+    categorie = [c for c in scraper_amazon.CATEGORIES if c['name'] in per_categoria]
+
+    def ciclo():
+        with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+            output = scraper_amazon.CrawlOutput(os.path.join(tmp, "out.csv"))
+            extractor = CardExtractor()
+            for cat in categorie:
+                pages = sorted(per_categoria[cat['name']])
+                html_by_url = {scraper_amazon.page_url(cat, p): per_categoria[cat['name']][p] for p in pages}
+                scraper_amazon.crawl_pages(_ReplayFetcher(html_by_url), cat, pages, extractor, output)
+            output.flush()
+    risultati["estrazione/crawl_pages ms/pagina"] = timed(ciclo, repeat) / len(pagine) * 1000
+    return risultati
+
+
+def bench_helpers(repeat, calls=100_000):
+    date = ["di Mario Rossi | 12 set. 2021", "Copertina flessibile", "3 mag. 1999 | Copertina rigida"]
+    recensioni = ["1.532", "23.000", "(61)", ""]
+    autori = ["Alessandro Barbero", "Mario Rossi e Luca Bianchi", "Anna Verdi, Paolo Neri", "AA.VV."]
+    risultati = {}
+    for nome, fn, valori in (("extract_date", extract_date, date),
+                             ("clean_reviews_count", clean_reviews_count, recensioni),
+                             ("is_multiple_author", is_multiple_author, autori)):
+        argomenti = [valori[i % len(valori)] for i in range(calls)]
+        secondi = timed(lambda: [fn(v) for v in argomenti], repeat)
+        risultati[f"helper/{nome} us/chiamata"] = secondi / calls * 1e6
+    return risultati
+
+
+def bench_storage(df, repeat):
+    n = len(df)
+    risultati = {}
+    righe = df.to_dict('records')
+    pagine = [righe[i:i + RIGHE_PER_PAGINA] for i in range(0, n, RIGHE_PER_PAGINA)]
+    # Accodamento pagina per pagina: oltre 100k righe si misura un campione e si scala
+    campione = pagine[:max(1, 100_000 // RIGHE_PER_PAGINA)]
+    scala = len(pagine) / len(campione)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "libri.csv")
+
+        def accoda_csv():
+            if os.path.exists(path): os.remove(path)
+            for pagina in campione:
+                append_to_csv(pagina, path)
+        risultati[f"archivio/csv_append s [{n}]"] = timed(accoda_csv, 1) * scala
+
+        df.sample(frac=1, random_state=0).to_csv(path, index=False)
+        with contextlib.redirect_stdout(io.StringIO()):
+            risultati[f"archivio/csv_sort s [{n}]"] = timed(lambda: sort_final_csv(path, dedupe=True), repeat)
+
+        def accoda_sqlite():
+            db = os.path.join(tmp, "libri.sqlite")
+            store = SqliteStore(db)
+            store.reset()
+            for i in range(0, len(campione), 10):
+                store.append([r for pagina in campione[i:i + 10] for r in pagina])
+            store.close()
+        risultati[f"archivio/sqlite_append s [{n}]"] = timed(accoda_sqlite, 1) * scala
+    return risultati
+
+
+def bench_app(df, repeat, search_limit):
+    n = len(df)
+    risultati = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "libri.csv")
+        df.to_csv(path, index=False)
+        caricato = {}
+
+        def carica():
+            caricato['df'] = load_amazon_data(path).reset_index(drop=True)
+        risultati[f"app/load_amazon_data s [{n}]"] = timed(carica, repeat)
+        risultati[f"app/memoria_csv MB [{n}]"] = memory_mb(caricato['df'])
+
+        # Formato compatto: conversione (una volta per CSV) e apertura in memory-map
+        compatto = {}
+        risultati[f"app/conversione_compatta s [{n}]"] = timed(lambda: compatto.setdefault('path', ensure_compact(path)), 1)
+        def apri():
+            compatto['df'], compatto['lazy'] = load_compact(compatto['path'])
+        risultati[f"app/load_compatto s [{n}]"] = timed(apri, repeat)
+        risultati[f"app/memoria_compatta MB [{n}]"] = memory_mb(compatto['df'])
+        # Il file mappato va chiuso prima che la cartella temporanea venga eliminata
+        compatto.clear()
+
+    df_app = caricato['df']
+    indice = {}
+    risultati[f"app/indice_filtri s [{n}]"] = timed(lambda: indice.setdefault('q', BookQueryIndex(df_app)), 1)
+    q = indice['q']
+    risultati[f"app/memoria_indice_filtri MB [{n}]"] = q.nbytes / 1024 ** 2
+
+    # Filtro e ordinamento senza la cache dei risultati: combinazioni tipiche della sidebar, tutte diverse
+    combinazioni = [(cat, rec, asc) for cat in [TUTTE] + q.categorie[:3] for rec in (60, 500, 5000) for asc in (False, True)]
+    def filtra():
+        q.clear_cache()
+        for cat, rec, asc in combinazioni:
+            q.page(q.query(category=cat, min_reviews=rec, ascending=asc), 48)
+    risultati[f"app/filtro_ordinamento ms/query [{n}]"] = timed(filtra, repeat) / len(combinazioni) * 1000
+
+    if n <= search_limit:
+        testo = {}
+        risultati[f"app/indice_ricerca s [{n}]"] = timed(lambda: testo.setdefault('t', TextSearchIndex.from_frame(df_app)), 1)
+        risultati[f"app/memoria_indice_ricerca MB [{n}]"] = testo['t'].nbytes / 1024 ** 2
+        ricerche = ["barbero", "storia di roma", "alberto angla", "guida cucina"]
+        secondi = timed(lambda: [testo['t'].search(r) for r in ricerche], repeat)
+        risultati[f"app/ricerca ms/query [{n}]"] = secondi / len(ricerche) * 1000
+    return risultati
+
+
+# --- STORICO E REGRESSIONI ---
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def load_results(path):
+    if not os.path.exists(path): return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(riga) for riga in f if riga.strip()]
+
+
+def compare(attuali, precedenti, soglia):
+    """Ritorna (regressioni, miglioramenti): liste di (misura, prima, dopo, rapporto)."""
+    regressioni, miglioramenti = [], []
+    for nome, valore in attuali.items():
+        prima = precedenti.get(nome)
+        if not prima: continue
+        rapporto = valore / prima
+        if rapporto > 1 + soglia:
+            regressioni.append((nome, prima, valore, rapporto))
+        elif rapporto < 1 - soglia:
+            miglioramenti.append((nome, prima, valore, rapporto))
+    return regressioni, miglioramenti
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark offline di estrazione, archivio e app")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="Righe dei dataset sintetici, separate da virgola (default: 1000,100000,1000000)")
+    parser.add_argument("--snapshots", default=DEFAULT_SNAPSHOT_DIR,
+                        help="Archivio snapshot da cui leggere le pagine registrate (se manca: pagine sintetiche)")
+    parser.add_argument("--pages", type=int, default=60, help="Pagine usate per l'estrazione (default: 60)")
+    parser.add_argument("--repeat", type=int, default=3, help="Ripetizioni di ogni misura, si tiene la migliore")
+    parser.add_argument("--search-limit", type=int, default=100_000,
+                        help="Dimensione massima su cui costruire l'indice di ricerca (default: 100000)")
+    parser.add_argument("--results", default=RESULTS_FILE, help=f"Storico dei risultati (default: {RESULTS_FILE})")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="Variazione oltre la quale si segnala una regressione (default: 0.15 = 15%%)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Esce con codice 1 se ci sono regressioni")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+
+    pagine = recorded_pages(args.snapshots, args.pages)
+    fonte = f"{len(pagine)} pagine registrate da {args.snapshots}"
+    if not pagine:
+        pagine = synthetic_pages(args.pages)
+        fonte = f"{len(pagine)} pagine sintetiche"
+    print(f"--- Benchmark: {fonte}, dataset {', '.join(map(str, sizes))} righe ---")
+
+    risultati = {}
+    risultati.update(bench_extraction(pagine, args.repeat))
+    risultati.update(bench_helpers(args.repeat))
+    for n in sizes:
+        print(f"  dataset da {n} righe...")
+        df = synthetic_dataset(n)
+        risultati.update(bench_storage(df, args.repeat))
+        risultati.update(bench_app(df, args.repeat, args.search_limit))
+
+    larghezza = max(map(len, risultati))
+    for nome, valore in risultati.items():
+        print(f"{nome:<{larghezza}}  {valore:10.3f}")
+
+    # Confronto con l'ultimo run sulle stesse fixture
+    precedenti = [r for r in load_results(args.results) if r.get("fonte") == fonte]
+    regressioni = []
+    if precedenti:
+        ultimo = precedenti[-1]
+        regressioni, miglioramenti = compare(risultati, ultimo["risultati"], args.threshold)
+        print(f"\n--- Confronto con il run del {time.strftime('%Y-%m-%d %H:%M', time.localtime(ultimo['ts']))}"
+              f" (commit {ultimo.get('commit') or '?'}) ---")
+        for etichetta, voci in (("⚠️  REGRESSIONE", regressioni), ("✅ miglioramento", miglioramenti)):
+            for nome, prima, dopo, rapporto in voci:
+                print(f"{etichetta}: {nome}: {prima:.3f} -> {dopo:.3f} (x{rapporto:.2f})")
+        if not regressioni and not miglioramenti:
+            print(f"Nessuna variazione oltre il {args.threshold:.0%}.")
+
+    with open(args.results, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"ts": time.time(), "commit": git_commit(), "python": sys.version.split()[0],
+                            "fonte": fonte, "risultati": risultati}, ensure_ascii=False) + "\n")
+    print(f"\nRisultati salvati in {args.results}")
+    if regressioni and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+import re
+import time
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+# --- ESTRAZIONE DELLE CARD DAI RISULTATI DI RICERCA ---
+# Tre backend intercambiabili che producono gli stessi campi:
+#   "lxml"       -> albero libxml2 + XPath (default se installato)
+#   "selectolax" -> motore a selettori CSS (lexbor), opzionale
+#   "bs4"        -> BeautifulSoup con html.parser, implementazione di riferimento
+# Ogni card viene letta con un solo passaggio sull'albero; gli scarti più economici
+# (ASIN già visto, recensioni sotto soglia, più autori) avvengono prima di estrarre il resto.
+
+RESULT_COMPONENT = "s-search-result"
+AUTHOR_PREFIX_RE = re.compile(r'^di\s+', re.IGNORECASE)
+DATE_RE = re.compile(r'(\d{1,2}\s+[a-zA-Z]{3}\.?\s+\d{4})')
+NON_DIGIT_RE = re.compile(r'[^\d]')
+NEXT_PAGE_CLASS_RE = re.compile(r'class="([^"]*\bs-pagination-next\b[^"]*)"')
+
+# Come BeautifulSoup.get_text: il testo di script/style/template non fa parte della card
+_SKIP_TEXT_TAGS = frozenset(('script', 'style', 'template'))
+
+
+def clean_reviews_count(text):
+    if not text: return 0
+    clean = NON_DIGIT_RE.sub('', text)
+    try:
+        return int(clean)
+    except:
+        return 0
+
+def is_multiple_author(author_text):
+    if not author_text: return True
+    text = author_text.lower()
+    if ',' in text: return True
+    if ' e ' in text: return True
+    if ' et ' in text or ' and ' in text: return True
+    return False
+
+def extract_date(text):
+    if not text: return ""
+    match = DATE_RE.search(text)
+    if match:
+        return match.group(1)
+    return ""
+
+def is_captcha_page(html):
+    """Riconosce la pagina di verifica di Amazon senza costruire l'albero HTML."""
+    if 'captchacharacters' in html: return True
+    return "inserisci i caratteri" in html.lower()
+
+def has_next_page(html):
+    """Legge la paginazione dei risultati: True/False, oppure None se la pagina non ne ha."""
+    match = NEXT_PAGE_CLASS_RE.search(html)
+    if not match: return None
+    return 's-pagination-disabled' not in match.group(1)
+
+def _join_strings(strings, separator):
+    """Replica get_text(separator, strip=True): stringhe ripulite, vuote scartate."""
+    return separator.join(s for s in (s.strip() for s in strings) if s)
+
+def _author_from_row(row_text):
+    if AUTHOR_PREFIX_RE.match(row_text):
+        raw_auth = AUTHOR_PREFIX_RE.sub('', row_text)
+        raw_auth = raw_auth.split('|')[0].split('(')[0]
+        return raw_auth.strip()
+    return None
+
+def _is_review_label(label):
+    return 'valutazioni' in label or 'voti' in label
+
+def _build_book(asin, img_url, title, author, date_found, reviews_count, category, position):
+    return {
+        'ASIN': asin,
+        'Copertina': img_url,
+        'Titolo': title,
+        'Autore': author,
+        'Data': date_found,
+        'Recensioni': reviews_count,
+        'Categoria': category,
+        # Posizione della card nella pagina (1 = prima); non fa parte del dataset, serve allo storico
+        'Posizione': position
+    }
+
+
+# --- BACKEND: BEAUTIFULSOUP (RIFERIMENTO) ---
+class Bs4Backend:
+    name = "bs4"
+
+    def cards(self, html):
+        soup = BeautifulSoup(html, 'html.parser')
+        return soup.find_all('div', {'data-component-type': RESULT_COMPONENT})
+
+    def asin(self, card):
+        return card.get('data-asin')
+
+    def scan(self, card):
+        """Un solo giro sui discendenti: raccoglie i nodi che servono all'estrazione."""
+        title_tag = review_tag = review_span = img_tag = None
+        author_rows = []
+        for tag in card.find_all(True):
+            name = tag.name
+            if name == 'div':
+                if 'a-row' in tag.get('class', ()):
+                    author_rows.append(tag)
+            elif name == 'a':
+                if review_tag is None and tag.has_attr('aria-label') and _is_review_label(tag['aria-label']):
+                    review_tag = tag
+            elif name == 'span':
+                if review_span is None and 's-underline-text' in tag.get('class', ()):
+                    review_span = tag
+            elif name == 'h2':
+                if title_tag is None:
+                    title_tag = tag
+            elif name == 'img':
+                if img_tag is None and 's-image' in tag.get('class', ()):
+                    img_tag = tag
+        return title_tag, author_rows, review_tag, review_span, img_tag
+
+    def text(self, node, separator=" "):
+        return node.get_text(separator, strip=True)
+
+    def raw_text(self, node):
+        return node.get_text()
+
+    def attr(self, node, name):
+        return node[name]
+
+
+# --- BACKEND: LXML ---
+class LxmlBackend:
+    name = "lxml"
+
+    def cards(self, html):
+        root = lxml.html.document_fromstring(html)
+        return root.xpath('//div[@data-component-type="%s"]' % RESULT_COMPONENT)
+
+    def asin(self, card):
+        return card.get('data-asin')
+
+    def scan(self, card):
+        title_tag = review_tag = review_span = img_tag = None
+        author_rows = []
+        it = card.iter()
+        next(it)  # la card stessa non conta, come in find/find_all
+        for el in it:
+            name = el.tag
+            if name == 'div':
+                if 'a-row' in el.get('class', '').split():
+                    author_rows.append(el)
+            elif name == 'a':
+                if review_tag is None:
+                    label = el.get('aria-label')
+                    if label is not None and _is_review_label(label):
+                        review_tag = el
+            elif name == 'span':
+                if review_span is None and 's-underline-text' in el.get('class', '').split():
+                    review_span = el
+            elif name == 'h2':
+                if title_tag is None:
+                    title_tag = el
+            elif name == 'img':
+                if img_tag is None and 's-image' in el.get('class', '').split():
+                    img_tag = el
+        return title_tag, author_rows, review_tag, review_span, img_tag
+
+    def _strings(self, el):
+        if el.text: yield el.text
+        for child in el:
+            # I commenti hanno un tag non stringa: si tiene solo il testo che li segue
+            if isinstance(child.tag, str) and child.tag not in _SKIP_TEXT_TAGS:
+                yield from self._strings(child)
+            if child.tail: yield child.tail
+
+    def text(self, node, separator=" "):
+        return _join_strings(self._strings(node), separator)
+
+    def raw_text(self, node):
+        return "".join(self._strings(node))
+
+    def attr(self, node, name):
+        value = node.get(name)
+        if value is None: raise KeyError(name)
+        return value
+
+
+# --- BACKEND: SELECTOLAX (SELETTORI CSS) ---
+class SelectolaxBackend:
+    name = "selectolax"
+
+    def cards(self, html):
+        tree = LexborHTMLParser(html)
+        return tree.css(f'div[data-component-type="{RESULT_COMPONENT}"]')
+
+    def asin(self, card):
+        return card.attributes.get('data-asin')
+
+    def scan(self, card):
+        title_tag = review_tag = review_span = img_tag = None
+        author_rows = []
+        for el in card.traverse():
+            if el is card or el.mem_id == card.mem_id: continue
+            name = el.tag
+            if name == 'div':
+                if 'a-row' in (el.attributes.get('class') or '').split():
+                    author_rows.append(el)
+            elif name == 'a':
+                if review_tag is None:
+                    label = el.attributes.get('aria-label')
+                    if label is not None and _is_review_label(label):
+                        review_tag = el
+            elif name == 'span':
+                if review_span is None and 's-underline-text' in (el.attributes.get('class') or '').split():
+                    review_span = el
+            elif name == 'h2':
+                if title_tag is None:
+                    title_tag = el
+            elif name == 'img':
+                if img_tag is None and 's-image' in (el.attributes.get('class') or '').split():
+                    img_tag = el
+        return title_tag, author_rows, review_tag, review_span, img_tag
+
+    def _strings(self, node):
+        for child in node.iter(include_text=True):
+            tag = child.tag
+            if tag == '-text':
+                yield child.text_content
+            elif not tag.startswith('-') and tag not in _SKIP_TEXT_TAGS:
+                yield from self._strings(child)
+
+    def text(self, node, separator=" "):
+        return _join_strings(self._strings(node), separator)
+
+    def raw_text(self, node):
+        return "".join(self._strings(node))
+
+    def attr(self, node, name):
+        value = node.attributes.get(name)
+        if value is None: raise KeyError(name)
+        return value
+
+
+BACKENDS = {
+    "bs4": Bs4Backend,
+    "lxml": LxmlBackend,
+    "selectolax": SelectolaxBackend,
+}
+
+def available_backends():
+    disponibili = ["bs4"]
+    if lxml is not None: disponibili.append("lxml")
+    if LexborHTMLParser is not None: disponibili.append("selectolax")
+    return disponibili
+
+DEFAULT_BACKEND = "lxml" if lxml is not None else "bs4"
+
+def get_backend(name=None):
+    name = name or DEFAULT_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Backend sconosciuto: {name} (disponibili: {', '.join(BACKENDS)})")
+    if name not in available_backends():
+        raise ImportError(f"Il backend '{name}' richiede un pacchetto non installato.")
+    return BACKENDS[name]()
+
+
+class CardExtractor:
+    def __init__(self, backend=None, min_reviews=60):
+        self.backend = backend if hasattr(backend, "scan") else get_backend(backend)
+        self.min_reviews = min_reviews
+
+    def extract(self, html, category, visti_asin=None, stats=None, timings=None, rejected=None):
+        """Estrae i libri validi da una pagina di risultati.
+
+        Ritorna (numero di card trovate, libri accettati). visti_asin viene solo letto per
+        scartare subito gli ASIN già salvati (la deduplica definitiva spetta a chi scrive);
+        stats (un dict/Counter) conta gli scarti per motivo; timings (dict) riceve i secondi
+        spesi in 'parsing' (albero HTML) ed 'estrazione' (lettura delle card); rejected (lista)
+        riceve (ASIN, motivo) delle card scartate dopo il controllo dei duplicati.
+        """
+        b = self.backend
+        # HTML vuoto (es. richiesta fallita): lxml non accetta un documento vuoto
+        if not html or not html.strip():
+            return 0, []
+        if visti_asin is None: visti_asin = ()
+        visti_pagina = set()
+        inizio = time.perf_counter()
+        results = b.cards(html)
+        parsing = time.perf_counter()
+        page_books = []
+        asin = None
+
+        def scarta(motivo):
+            _count(stats, motivo)
+            if rejected is not None and asin:
+                rejected.append((asin, motivo))
+
+        for position, card in enumerate(results, start=1):
+            asin = None
+            try:
+                asin = b.asin(card)
+                if not asin:
+                    _count(stats, 'senza_asin')
+                    continue
+                if asin in visti_asin or asin in visti_pagina:
+                    _count(stats, 'duplicato')
+                    continue
+
+                title_tag, author_rows, review_tag, review_span, img_tag = b.scan(card)
+
+                reviews_count = 0
+                if review_tag is not None:
+                    reviews_count = clean_reviews_count(b.attr(review_tag, 'aria-label').split()[0])
+                elif review_span is not None:
+                    reviews_count = clean_reviews_count(b.raw_text(review_span))
+
+                if reviews_count < self.min_reviews:
+                    scarta('poche_recensioni')
+                    continue
+
+                author = "N/D"
+                for row in author_rows:
+                    found = _author_from_row(b.text(row))
+                    if found is not None:
+                        author = found
+                        break
+
+                if author == "N/D":
+                    scarta('senza_autore')
+                    continue
+                if is_multiple_author(author):
+                    scarta('piu_autori')
+                    continue
+
+                title = b.text(title_tag, "") if title_tag is not None else "N/D"
+                date_found = extract_date(b.text(card))
+                img_url = b.attr(img_tag, 'src') if img_tag is not None else ""
+
+                visti_pagina.add(asin)
+                page_books.append(_build_book(asin, img_url, title, author, date_found, reviews_count, category, position))
+                _count(stats, 'accettati')
+
+            except Exception:
+                scarta('errore')
+                continue
+
+        if timings is not None:
+            timings['parsing'] = timings.get('parsing', 0.0) + parsing - inizio
+            timings['estrazione'] = timings.get('estrazione', 0.0) + time.perf_counter() - parsing
+        return len(results), page_books
+
+def _count(stats, key):
+    if stats is not None:
+        stats[key] = stats.get(key, 0) + 1
@@ -0,0 +1,151 @@
+import os
+import glob
+import hashlib
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from dataset_store import COLUMNS
+
+# --- DATASET COMPATTO PER L'APP ---
+# Il CSV dello scraper viene convertito una volta in un file Arrow (Feather v2, non compresso)
+# che si apre in memory-map: le colonne non vengono copiate in RAM finché non servono.
+#   Categoria  -> categorical (6 valori)
+#   Autore     -> dizionario (molti titoli per autore)
+#   Recensioni -> intero senza segno più piccolo che basta
+# In memoria (DataFrame) restano solo ASIN, Recensioni e Categoria, che servono a filtri e
+# ordinamento; Titolo, Autore, Copertina e Data si leggono dal file solo per le righe mostrate.
+# Il nome del file contiene la firma del CSV (dimensione + mtime): un CSV nuovo produce un
+# file nuovo, senza sovrascrivere quello eventualmente ancora mappato da un'altra sessione.
+
+EAGER_COLUMNS = ['ASIN', 'Recensioni', 'Categoria']
+LAZY_COLUMNS = ['Titolo', 'Autore', 'Copertina', 'Data']
+BATCH_ROWS = 65536
+
+
+def file_signature(path, content_hash=False):
+    """Firma di un file per invalidare le cache: (dimensione, mtime) o sha256 del contenuto."""
+    if not path or not os.path.exists(path):
+        return None
+    if content_hash:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for blocco in iter(lambda: f.read(1 << 20), b""):
+                h.update(blocco)
+        return h.hexdigest()
+    st = os.stat(path)
+    return f"{st.st_size}-{st.st_mtime_ns}"
+
+
+def compact_path_for(csv_path, signature):
+    return f"{csv_path}.{signature}.arrow"
+
+
+def clean_dataset(df):
+    """Pulizia dell'app: titoli e autori mancanti, ASIN e titoli duplicati."""
+    df['Titolo'] = df['Titolo'].fillna("Senza Titolo")
+    df['Autore'] = df['Autore'].fillna("N/D")
+
+    # --- RIMOZIONE DUPLICATI ---
+    df = df.drop_duplicates(subset=['ASIN'])
+    df = df.drop_duplicates(subset=['Titolo'])
+    return df
+
+
+def _compact_types(df):
+    """Tipi compatti: categorie per i testi ripetuti, interi piccoli per le recensioni."""
+    recensioni = pd.to_numeric(df['Recensioni'], errors='coerce').fillna(0)
+    massimo = int(recensioni.max()) if len(df) else 0
+    dtype = np.uint16 if massimo <= np.iinfo(np.uint16).max else np.uint32
+    return df.assign(
+        Recensioni=recensioni.astype(dtype),
+        Categoria=df['Categoria'].astype('category'),
+        Autore=df['Autore'].astype('category'),
+        ASIN=df['ASIN'].astype(str),
+        Titolo=df['Titolo'].astype(str),
+        Copertina=df['Copertina'].fillna("").astype(str),
+        Data=df['Data'].fillna("").astype(str),
+    )
+
+
+def write_compact(df, path):
+    """Scrive il DataFrame (già ripulito) nel formato Arrow, in modo atomico."""
+    tabella = pa.Table.from_pandas(_compact_types(df[COLUMNS]).reset_index(drop=True), preserve_index=False)
+    tmp = f"{path}.tmp"
+    feather.write_feather(tabella, tmp, compression="uncompressed")
+    os.replace(tmp, path)
+
+
+def ensure_compact(csv_path):
+    """Ritorna il file Arrow aggiornato per il CSV, convertendolo (già ripulito) solo se il CSV è cambiato."""
+    firma = file_signature(csv_path)
+    path = compact_path_for(csv_path, firma)
+    if os.path.exists(path):
+        return path
+    df = pd.read_csv(csv_path, dtype={'ASIN': str, 'Titolo': str, 'Autore': str, 'Copertina': str,
+                                      'Data': str, 'Categoria': str})
+    write_compact(clean_dataset(df), path)
+    # Le versioni precedenti si eliminano se possibile (su Windows un file mappato resta bloccato)
+    for vecchio in glob.glob(f"{glob.escape(csv_path)}.*.arrow"):
+        if vecchio != path:
+            try:
+                os.remove(vecchio)
+            except OSError:
+                pass
+    return path
+
+
+class LazyColumns:
+    """Colonne pesanti lette dal file mappato solo per le righe richieste."""
+
+    def __init__(self, table):
+        self.table = table
+
+    def take(self, positions):
+        """DataFrame con le colonne pesanti delle righe indicate (posizioni nel dataset)."""
+        return self.table.take(pa.array(np.asarray(positions, dtype=np.int64))).to_pandas()
+
+    def column(self, name):
+        """Colonna intera come lista Python."""
+        return self.table.column(name).to_pylist()
+
+    def iter_column(self, name, batch_rows=BATCH_ROWS):
+        """Valori della colonna a blocchi di batch_rows righe (es. per costruire l'indice di ricerca):
+        in memoria c'è un blocco alla volta invece della colonna intera."""
+        for chunk in self.table.column(name).chunks:
+            for inizio in range(0, len(chunk), batch_rows):
+                yield from chunk.slice(inizio, batch_rows).to_pylist()
+
+    @property
+    def nbytes(self):
+        return self.table.nbytes
+
+
+def load_compact(path):
+    """Apre il file Arrow in memory-map. Ritorna (DataFrame delle colonne leggere, LazyColumns)."""
+    tabella = feather.read_table(path, memory_map=True)
+    df = tabella.select(EAGER_COLUMNS).to_pandas()
+    return df, LazyColumns(tabella.select(LAZY_COLUMNS))
+
+
+def memory_mb(df):
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
+
+
+if __name__ == "__main__":
+    # Confronto CSV / formato compatto: python compact_dataset.py amazon_libri_multicat.csv
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else "amazon_libri_multicat.csv"
+    inizio = time.perf_counter()
+    df_csv = pd.read_csv(csv_path)
+    t_csv = time.perf_counter() - inizio
+    path = ensure_compact(csv_path)
+    inizio = time.perf_counter()
+    df, lazy = load_compact(path)
+    t_arrow = time.perf_counter() - inizio
+    print(f"CSV:    {len(df_csv)} righe, {memory_mb(df_csv):.1f} MB in memoria, lettura {t_csv:.3f} s")
+    print(f"Arrow:  {len(df)} righe, {memory_mb(df):.1f} MB in memoria (+{lazy.nbytes / 1024 ** 2:.1f} MB mappati), "
+          f"apertura {t_arrow:.3f} s")
@@ -0,0 +1,228 @@
+import io
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from http_fetcher import DEFAULT_HEADERS
+
+try:
+    from PIL import Image
+except ImportError:  # senza Pillow le miniature sono le immagini originali
+    Image = None
+
+# --- CACHE LOCALE DELLE COPERTINE ---
+# Le immagini scaricate sono indirizzate per contenuto (sha256): URL diversi con la stessa
+# copertina occupano spazio una volta sola.
+#   <root>/objects/ab/abcdef....img        originale
+#   <root>/thumbs/ab/abcdef....jpg         miniatura ridimensionata (quella servita dall'app)
+#   <root>/index.sqlite                    url -> hash, dimensioni e ultimo accesso (LRU)
+# Quando lo spazio occupato supera max_bytes si eliminano le copertine usate meno di recente.
+# Gli URL che non restituiscono un'immagine vengono ricordati, così l'app mostra subito il segnaposto.
+# La cartella predefinita sta sotto static/: l'app la fa servire direttamente da Streamlit
+# (server.enableStaticServing) e al browser passa solo il percorso della miniatura.
+
+COVER_CACHE_DIR = os.path.join("static", "covers")
+DEFAULT_MAX_MB = 500
+THUMB_SIZE = (300, 450)
+
+
+class CoverCache:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS url (
+            url    TEXT PRIMARY KEY,
+            digest TEXT
+        );
+        CREATE TABLE IF NOT EXISTS copertina (
+            digest          TEXT PRIMARY KEY,
+            bytes           INTEGER NOT NULL,
+            ultimo_accesso  REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_copertina_accesso ON copertina (ultimo_accesso);
+    """
+
+    def __init__(self, root=COVER_CACHE_DIR, max_mb=DEFAULT_MAX_MB, thumb_size=THUMB_SIZE, timeout=10):
+        self.root = root
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.thumb_size = thumb_size
+        self.timeout = timeout
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(root, "index.sqlite"), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(self.SCHEMA)
+        self._local = threading.local()
+        self.stats = {"scaricate": 0, "duplicate": 0, "errori": 0, "eliminate": 0}
+
+    def _count_error(self):
+        with self._lock:
+            self.stats["errori"] += 1
+
+    def _session(self):
+        # Una sessione keep-alive per thread
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+            self._local.session.headers.update(DEFAULT_HEADERS)
+        return self._local.session
+
+    def object_path(self, digest):
+        return os.path.join(self.root, "objects", digest[:2], f"{digest}.img")
+
+    def thumb_path(self, digest):
+        return os.path.join(self.root, "thumbs", digest[:2], f"{digest}.jpg")
+
+    def _make_thumbnail(self, data):
+        if Image is None: return data
+        try:
+            with Image.open(io.BytesIO(data)) as img:
+                img.thumbnail(self.thumb_size)
+                buffer = io.BytesIO()
+                img.convert("RGB").save(buffer, format="JPEG", quality=85, optimize=True)
+                return buffer.getvalue()
+        except Exception:
+            return None
+
+    def is_known(self, url):
+        """True se l'URL è già stato scaricato (o è noto come non valido)."""
+        with self._lock:
+            return self.conn.execute("SELECT 1 FROM url WHERE url = ?", (url,)).fetchone() is not None
+
+    def download(self, url):
+        """Scarica una copertina (se non già in cache) e ritorna il suo hash, o None se non valida."""
+        with self._lock:
+            riga = self.conn.execute("SELECT digest FROM url WHERE url = ?", (url,)).fetchone()
+        if riga is not None:
+            return riga[0]
+
+        try:
+            risposta = self._session().get(url, timeout=self.timeout)
+        except requests.RequestException:
+            # Errore di rete: non si registra nulla, si riproverà più avanti
+            self._count_error()
+            return None
+        if risposta.status_code not in (200, 404, 410):
+            # Errori temporanei (429, 5xx, ...): come per la rete, l'URL resta da riprovare
+            self._count_error()
+            return None
+
+        # Solo un URL inesistente (404/410) o un'immagine illeggibile viene ricordato come non valido
+        data = risposta.content if risposta.status_code == 200 else b""
+        thumb = self._make_thumbnail(data) if data else None
+        digest = hashlib.sha256(data).hexdigest() if thumb else None
+        if digest is not None:
+            self._write_object(digest, data, thumb)
+
+        with self._lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO url (url, digest) VALUES (?, ?)", (url, digest))
+            if digest is None:
+                self.stats["errori"] += 1
+        if digest is not None:
+            self._evict()
+        return digest
+
+    def _write_object(self, digest, data, thumb):
+        with self._lock:
+            # Evita di riscrivere i file di una copertina già in cache
+            if self.conn.execute("SELECT 1 FROM copertina WHERE digest = ?", (digest,)).fetchone():
+                self.stats["duplicate"] += 1
+                return
+        for path, contenuto in ((self.object_path(digest), data), (self.thumb_path(digest), thumb)):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(contenuto)
+            os.replace(tmp, path)
+        with self._lock, self.conn:
+            cur = self.conn.execute(
+                "INSERT OR IGNORE INTO copertina (digest, bytes, ultimo_accesso) VALUES (?, ?, ?)",
+                (digest, len(data) + len(thumb), time.time()),
+            )
+            # Due URL con la stessa immagine possono superare insieme il controllo qui sopra:
+            # conta come scaricata solo quella che ha inserito la riga
+            self.stats["scaricate" if cur.rowcount == 1 else "duplicate"] += 1
+
+    def _evict(self):
+        """Elimina le copertine meno usate finché lo spazio torna sotto il 90% del limite."""
+        with self._lock:
+            totale = self.conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM copertina").fetchone()[0]
+            if totale <= self.max_bytes: return
+            obiettivo = self.max_bytes * 0.9
+            vittime = []
+            for digest, size in self.conn.execute("SELECT digest, bytes FROM copertina ORDER BY ultimo_accesso"):
+                if totale <= obiettivo: break
+                vittime.append(digest)
+                totale -= size
+            with self.conn:
+                self.conn.executemany("DELETE FROM copertina WHERE digest = ?", [(d,) for d in vittime])
+                # Gli URL tornano "sconosciuti": verranno riscaricati se servono di nuovo
+                self.conn.executemany("DELETE FROM url WHERE digest = ?", [(d,) for d in vittime])
+            self.stats["eliminate"] += len(vittime)
+        for digest in vittime:
+            for path in (self.object_path(digest), self.thumb_path(digest)):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def thumbnail_paths(self, urls):
+        """File delle miniature già in cache per gli URL dati: {url: percorso, o None se l'URL non è un'immagine}.
+
+        Gli URL mai scaricati (o la cui miniatura è stata eliminata) non compaiono nel risultato.
+        Aggiorna l'ultimo accesso (LRU).
+        """
+        urls = list(dict.fromkeys(u for u in urls if u))
+        if not urls: return {}
+        with self._lock:
+            segnaposti = ", ".join("?" * len(urls))
+            righe = self.conn.execute(f"SELECT url, digest FROM url WHERE url IN ({segnaposti})", urls).fetchall()
+            digests = {d for _, d in righe if d}
+            if digests:
+                with self.conn:
+                    self.conn.executemany("UPDATE copertina SET ultimo_accesso = ? WHERE digest = ?",
+                                          [(time.time(), d) for d in digests])
+        risultato = {}
+        for url, digest in righe:
+            if digest is None:
+                risultato[url] = None
+            elif os.path.exists(self.thumb_path(digest)):
+                risultato[url] = self.thumb_path(digest)
+            # altrimenti eliminata da un altro processo: verrà riscaricata
+        return risultato
+
+    def close(self):
+        self.conn.close()
+
+
+class CoverPrefetcher:
+    """Scarica copertine in background (scraper: mentre salva i libri; app: la pagina successiva)."""
+
+    def __init__(self, cache, workers=4):
+        self.cache = cache
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._in_corso = set()
+        self._lock = threading.Lock()
+
+    def submit(self, urls):
+        for url in urls:
+            if not isinstance(url, str) or not url.startswith("http"): continue
+            with self._lock:
+                if url in self._in_corso: continue
+                self._in_corso.add(url)
+            self._pool.submit(self._download, url)
+
+    def _download(self, url):
+        try:
+            if not self.cache.is_known(url):
+                self.cache.download(url)
+        finally:
+            with self._lock:
+                self._in_corso.discard(url)
+
+    def pending(self):
+        with self._lock:
+            return len(self._in_corso)
+
+    def close(self, wait=True):
+        self._pool.shutdown(wait=wait, cancel_futures=not wait)
@@ -0,0 +1,89 @@
+import os
+import json
+import time
+import threading
+
+# --- GIORNALE DEL CRAWL ---
+# Tiene traccia delle pagine completate (categoria, pagina), delle categorie arrivate a
+# fine catalogo e degli ASIN già salvati. Viene riscritto in modo atomico (file temporaneo
+# + os.replace) dopo ogni pagina: un'interruzione lascia sempre la versione precedente intatta.
+
+
+def journal_path_for(output_file):
+    return f"{output_file}.journal.json"
+
+
+class CrawlJournal:
+    def __init__(self, path):
+        self.path = path
+        self.pagine_completate = {}   # {categoria: set(pagine)}
+        self.categorie_finite = set()
+        self.pagine_stop = {}         # {categoria: pagina di fine catalogo}; le successive non servono
+        self.visti_asin = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        """Carica il giornale da disco; se non esiste ne ritorna uno vuoto."""
+        journal = cls(path)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            journal.pagine_completate = {cat: set(pages) for cat, pages in data.get("pagine_completate", {}).items()}
+            journal.categorie_finite = set(data.get("categorie_finite", []))
+            journal.pagine_stop = data.get("pagine_stop", {})
+            journal.visti_asin = set(data.get("visti_asin", []))
+        return journal
+
+    def reset(self):
+        """Cancella il giornale su disco (nuovo crawl da zero)."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def is_page_done(self, category, page):
+        return page in self.pagine_completate.get(category, ())
+
+    def is_category_done(self, category):
+        """Finita se è arrivata a fine catalogo e tutte le pagine fino allo stop sono completate."""
+        if category in self.categorie_finite: return True
+        stop = self.pagine_stop.get(category)
+        return stop is not None and not self.pending_pages(category, range(1, stop + 1))
+
+    def pending_pages(self, category, pages):
+        """Filtra le pagine ancora da scaricare (e non oltre lo stop), mantenendone l'ordine."""
+        done = self.pagine_completate.get(category, set())
+        stop = self.pagine_stop.get(category)
+        return [p for p in pages if p not in done and (stop is None or p <= stop)]
+
+    def record_page(self, category, page, nuovi_asin=()):
+        self.record_pages([(category, page, nuovi_asin)])
+
+    def record_pages(self, records):
+        """Segna più pagine in una sola scrittura: records = [(categoria, pagina, nuovi_asin), ...]."""
+        with self._lock:
+            for category, page, nuovi_asin in records:
+                self.pagine_completate.setdefault(category, set()).add(page)
+                self.visti_asin.update(nuovi_asin)
+            self._write()
+
+    def record_category_stop(self, category, page):
+        """Fine catalogo a `page`. Nel crawl parallelo i blocchi precedenti possono essere ancora in corso:
+        la categoria risulta finita solo quando anche le loro pagine sono completate."""
+        with self._lock:
+            self.pagine_stop[category] = min(page, self.pagine_stop.get(category, page))
+            self._write()
+
+    def _write(self):
+        data = {
+            "aggiornato": time.time(),
+            "pagine_completate": {cat: sorted(pages) for cat, pages in self.pagine_completate.items()},
+            "categorie_finite": sorted(self.categorie_finite),
+            "pagine_stop": self.pagine_stop,
+            "visti_asin": sorted(self.visti_asin),
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
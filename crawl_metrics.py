@@ -0,0 +1,134 @@
+import sys
+import json
+import time
+import threading
+from collections import defaultdict
+
+# --- METRICHE DEL CRAWL PER PAGINA E PER FASE ---
+# Ogni pagina produce una riga JSON nel file delle metriche con i secondi spesi in ogni fase
+# e i contatori (card viste, scarti per motivo, captcha, ASIN nuovi). I tempi misurati dai
+# fetcher (che possono girare in altri thread) vengono accumulati per URL e uniti alla pagina
+# quando questa viene elaborata. A fine run: percentili per fase e throughput per categoria.
+#
+# Fasi: attesa (pausa del pacer), http, browser_get, scroll, captcha, snapshot,
+#       parsing, estrazione, scrittura
+
+FASI = ("attesa", "http", "browser_get", "scroll", "captcha", "snapshot", "parsing", "estrazione", "scrittura")
+
+
+def metrics_path_for(output):
+    return f"{output}.metrics.jsonl"
+
+
+def percentile(valori, q):
+    """Percentile q (0-100) con interpolazione lineare; 0 se non ci sono valori."""
+    if not valori: return 0.0
+    ordinati = sorted(valori)
+    pos = (len(ordinati) - 1) * q / 100
+    basso = int(pos)
+    alto = min(basso + 1, len(ordinati) - 1)
+    return ordinati[basso] + (ordinati[alto] - ordinati[basso]) * (pos - basso)
+
+
+class CrawlMetrics:
+    def __init__(self, path=None, append=False):
+        self.path = path
+        self._file = open(path, "a" if append else "w", encoding="utf-8") if path else None
+        self._lock = threading.Lock()
+        self._in_corso = defaultdict(lambda: {"tempi": defaultdict(float), "contatori": defaultdict(int)})
+        self.righe = []
+
+    # --- RACCOLTA ---
+    def add(self, key, stage, seconds):
+        with self._lock:
+            self._in_corso[key]["tempi"][stage] += seconds
+
+    def count(self, key, name, n=1):
+        with self._lock:
+            self._in_corso[key]["contatori"][name] += n
+
+    def record_page(self, category, page, key, cards, scarti, nuovi, tempi=None):
+        """Chiude la pagina: unisce i tempi misurati per `key` (l'URL) e scrive la riga JSON."""
+        with self._lock:
+            parziale = self._in_corso.pop(key, None)
+            tempi_pagina = dict(parziale["tempi"]) if parziale else {}
+            contatori = dict(parziale["contatori"]) if parziale else {}
+            for stage, secondi in (tempi or {}).items():
+                tempi_pagina[stage] = tempi_pagina.get(stage, 0.0) + secondi
+            riga = {
+                "ts": time.time(),
+                "categoria": category,
+                "pagina": page,
+                "tempi": {k: round(v, 6) for k, v in tempi_pagina.items()},
+                "card": cards,
+                "scarti": {k: v for k, v in scarti.items() if k != "accettati"},
+                "accettati": scarti.get("accettati", 0),
+                "captcha": contatori.pop("captcha", 0),
+                "nuovi": nuovi,
+            }
+            if contatori:
+                riga["contatori"] = contatori
+            self.righe.append(riga)
+            if self._file is not None:
+                self._file.write(json.dumps(riga, ensure_ascii=False) + "\n")
+                self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    # --- RIEPILOGO ---
+    def report(self):
+        print_report(self.righe)
+
+
+def load_metrics(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(riga) for riga in f if riga.strip()]
+
+
+def print_report(righe):
+    """Percentili per fase e throughput (pagine/min, libri/min) per categoria."""
+    if not righe:
+        print("Nessuna metrica registrata.")
+        return
+    print(f"\n{'='*20} METRICHE PER FASE {'='*20}")
+    per_fase = defaultdict(list)
+    for r in righe:
+        for stage, secondi in r["tempi"].items():
+            per_fase[stage].append(secondi)
+    totale = sum(sum(v) for v in per_fase.values()) or 1.0
+    ordine = [f for f in FASI if f in per_fase] + sorted(f for f in per_fase if f not in FASI)
+    print(f"{'fase':<12}{'pagine':>8}{'p50 s':>9}{'p90 s':>9}{'p99 s':>9}{'totale min':>12}{'quota':>8}")
+    for stage in ordine:
+        v = per_fase[stage]
+        print(f"{stage:<12}{len(v):>8}{percentile(v, 50):>9.3f}{percentile(v, 90):>9.3f}"
+              f"{percentile(v, 99):>9.3f}{sum(v)/60:>12.1f}{sum(v)/totale:>8.0%}")
+
+    print(f"\n{'='*20} THROUGHPUT PER CATEGORIA {'='*20}")
+    per_cat = defaultdict(list)
+    for r in righe:
+        per_cat[r["categoria"]].append(r)
+    for category, pagine in per_cat.items():
+        # Durata: dalla prima all'ultima pagina più la durata media di una pagina
+        ts = [p["ts"] for p in pagine]
+        durate = [sum(p["tempi"].values()) for p in pagine]
+        minuti = max(max(ts) - min(ts) + sum(durate) / len(durate), 1e-9) / 60
+        nuovi = sum(p["nuovi"] for p in pagine)
+        card = sum(p["card"] for p in pagine)
+        captcha = sum(p["captcha"] for p in pagine)
+        scarti = defaultdict(int)
+        for p in pagine:
+            for motivo, n in p["scarti"].items():
+                scarti[motivo] += n
+        dettaglio = ", ".join(f"{m} {n}" for m, n in sorted(scarti.items(), key=lambda x: -x[1]))
+        print(f"{category}: {len(pagine)/minuti:.1f} pagine/min, {nuovi/minuti:.1f} libri/min "
+              f"({len(pagine)} pagine, {card} card, {nuovi} nuovi, {captcha} captcha) | scarti: {dettaglio or '-'}")
+
+
+if __name__ == "__main__":
+    # Riepilogo di un file di metriche esistente: python crawl_metrics.py file.metrics.jsonl
+    if len(sys.argv) != 2:
+        sys.exit("Uso: python crawl_metrics.py <file .metrics.jsonl>")
+    print_report(load_metrics(sys.argv[1]))
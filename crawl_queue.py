@@ -0,0 +1,320 @@
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+from collections import namedtuple
+from contextlib import contextmanager
+
+import pandas as pd
+
+from dataset_store import COLUMNS, SqliteStore
+from pacing import AdaptivePacer
+
+# --- CODA DI LAVORO DEL CRAWL (SQLITE) ---
+# Il crawl è una coda durevole di lavori (categoria, pagina) in un file SQLite che più processi
+# worker consumano insieme (python scraper_amazon.py enqueue, poi worker):
+#   lease      -> un worker prende un lavoro per lease_seconds; se muore o si blocca, alla
+#                 scadenza il lavoro torna in coda e lo prende un altro; il worker che arriva in
+#                 ritardo non può più chiuderlo (il suo risultato viene scartato)
+#   tentativi  -> un errore rimette il lavoro in coda con un'attesa crescente, fino a
+#                 max_attempts; poi il lavoro finisce tra i falliti
+#   captcha    -> le pagine bloccate vanno in una lista a parte (dead-letter) invece di fermare
+#                 il crawl; dopo averle risolte si rimettono in coda con requeue
+#   ritmo      -> un solo AdaptivePacer con lo stato nel database: il limite di richieste vale
+#                 per tutti i worker insieme, non per ognuno
+# I libri estratti si scrivono nella tabella libri (stesso schema di SqliteStore) nella stessa
+# transazione che chiude il lavoro: la deduplica è sulla chiave ASIN e una pagina non viene
+# mai salvata a metà. Il file usa il journal classico (non WAL), così può stare anche su una
+# cartella condivisa tra più macchine, purché il filesystem gestisca i lock.
+
+QUEUE_FILE = "amazon_crawl_queue.sqlite"
+STATI = ("attesa", "in_corso", "fatto", "captcha", "fallito", "saltato")
+LEASE_SECONDS = 180
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 30.0   # secondi prima del secondo tentativo, poi raddoppia
+
+# scadenza identifica il lease: un lavoro riassegnato dopo la scadenza ha un'altra scadenza
+Job = namedtuple("Job", "categoria pagina tentativo worker scadenza")
+
+
+def _connect(path):
+    # Transazioni esplicite (BEGIN IMMEDIATE): il lock di scrittura si prende subito, così due
+    # worker non possono leggere lo stesso lavoro libero e assegnarselo entrambi
+    conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=DELETE")
+    return conn
+
+
+@contextmanager
+def _immediate(conn):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+class CrawlQueue:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS lavori (
+            categoria      TEXT NOT NULL,
+            pagina         INTEGER NOT NULL,
+            ordine         INTEGER NOT NULL DEFAULT 0,
+            stato          TEXT NOT NULL DEFAULT 'attesa',
+            tentativi      INTEGER NOT NULL DEFAULT 0,
+            disponibile_da REAL NOT NULL DEFAULT 0,
+            scadenza       REAL,
+            worker         TEXT,
+            errore         TEXT,
+            nuovi          INTEGER,
+            aggiornato     REAL,
+            PRIMARY KEY (categoria, pagina)
+        );
+        CREATE INDEX IF NOT EXISTS idx_lavori_stato ON lavori (stato, ordine, pagina);
+        CREATE TABLE IF NOT EXISTS ritmo (
+            id         INTEGER PRIMARY KEY CHECK (id = 1),
+            prossimo   REAL NOT NULL,
+            intervallo REAL NOT NULL,
+            minimo     REAL NOT NULL
+        );
+    """ + SqliteStore.SCHEMA
+
+    def __init__(self, path=QUEUE_FILE, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS,
+                 retry_delay=RETRY_DELAY):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._open()
+
+    def _open(self):
+        self.conn = _connect(self.path)
+        self.conn.executescript(self.SCHEMA)
+
+    def reset(self):
+        """Cancella coda e libri (nuovo crawl da zero)."""
+        self.conn.close()
+        for suffix in ("", "-journal"):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+        self._open()
+
+    # --- CARICAMENTO ---
+    def enqueue(self, jobs):
+        """Aggiunge i lavori (categoria, pagina, ordine) mancanti. Ritorna quanti sono nuovi."""
+        with _immediate(self.conn):
+            prima = self.conn.total_changes
+            self.conn.executemany("INSERT OR IGNORE INTO lavori (categoria, pagina, ordine) VALUES (?, ?, ?)", jobs)
+            return self.conn.total_changes - prima
+
+    def set_rate(self, min_delay, initial_delay=None):
+        """Pausa minima tra due richieste di tutta la coda (secondi), letta da ogni SharedPacer."""
+        with _immediate(self.conn):
+            self.conn.execute(
+                "INSERT INTO ritmo (id, prossimo, intervallo, minimo) VALUES (1, 0, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET minimo = excluded.minimo, intervallo = MAX(intervallo, excluded.minimo)",
+                (max(min_delay, initial_delay or 0), min_delay))
+
+    # --- LEASE ---
+    def lease(self, worker):
+        """Assegna al worker il prossimo lavoro disponibile (in ordine di categoria e pagina) o None."""
+        now = time.time()
+        with _immediate(self.conn):
+            # Lease scaduti: il worker è morto o bloccato, il lavoro torna disponibile
+            self.conn.execute(
+                "UPDATE lavori SET stato = CASE WHEN tentativi >= ? THEN 'fallito' ELSE 'attesa' END, "
+                "worker = NULL, errore = 'lease scaduto', aggiornato = ? "
+                "WHERE stato = 'in_corso' AND scadenza < ?", (self.max_attempts, now, now))
+            row = self.conn.execute(
+                "SELECT categoria, pagina, tentativi FROM lavori WHERE stato = 'attesa' AND disponibile_da <= ? "
+                "ORDER BY ordine, pagina LIMIT 1", (now,)).fetchone()
+            if row is None:
+                return None
+            categoria, pagina, tentativi = row
+            scadenza = now + self.lease_seconds
+            self.conn.execute(
+                "UPDATE lavori SET stato = 'in_corso', worker = ?, scadenza = ?, tentativi = tentativi + 1, "
+                "aggiornato = ? WHERE categoria = ? AND pagina = ?",
+                (worker, scadenza, now, categoria, pagina))
+        return Job(categoria, pagina, tentativi + 1, worker, scadenza)
+
+    # Il lavoro è ancora di questo worker: lease non scaduto e non riassegnato ad altri
+    _DEL_LEASE = "categoria = ? AND pagina = ? AND stato = 'in_corso' AND worker = ? AND scadenza = ?"
+
+    def _holds(self, job):
+        return self.conn.execute(f"SELECT 1 FROM lavori WHERE {self._DEL_LEASE}",
+                                 (job.categoria, job.pagina, job.worker, job.scadenza)).fetchone() is not None
+
+    def _set(self, job, stato, **campi):
+        """Chiude il lavoro se il lease è ancora del worker. Ritorna False se non lo è più (nulla cambia)."""
+        campi.update(stato=stato, worker=None, scadenza=None, aggiornato=time.time())
+        cur = self.conn.execute(
+            f"UPDATE lavori SET {', '.join(f'{c} = ?' for c in campi)} WHERE {self._DEL_LEASE}",
+            (*campi.values(), job.categoria, job.pagina, job.worker, job.scadenza))
+        return cur.rowcount == 1
+
+    def complete(self, job, books):
+        """Salva i libri della pagina e chiude il lavoro, in un'unica transazione. Ritorna i libri nuovi,
+        o None se il lease è scaduto o è passato a un altro worker (i libri non vengono scritti)."""
+        with _immediate(self.conn):
+            if not self._holds(job):
+                return None
+            prima = self.conn.total_changes
+            self.conn.executemany(
+                f"INSERT INTO libri ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))}) "
+                f"ON CONFLICT(ASIN) DO NOTHING",
+                [tuple(book[c] for c in COLUMNS) for book in books])
+            nuovi = self.conn.total_changes - prima
+            self._set(job, "fatto", errore=None, nuovi=nuovi)
+        return nuovi
+
+    def fail(self, job, error):
+        """Errore sul lavoro: torna in coda con attesa crescente, o tra i falliti. Ritorna il nuovo stato,
+        o None se il lease non è più del worker."""
+        stato = "fallito" if job.tentativo >= self.max_attempts else "attesa"
+        attesa = self.retry_delay * 2 ** (job.tentativo - 1) * random.uniform(0.8, 1.2)
+        with _immediate(self.conn):
+            if not self._set(job, stato, errore=str(error)[:500], disponibile_da=time.time() + attesa):
+                return None
+        return stato
+
+    def dead_letter(self, job, reason="captcha"):
+        """Pagina bloccata da un captcha: esce dalla coda finché non viene rimessa con requeue.
+        Ritorna False se il lease non è più del worker."""
+        with _immediate(self.conn):
+            return self._set(job, "captcha", errore=reason)
+
+    def release(self, job):
+        """Restituisce un lavoro interrotto (es. Ctrl-C) senza contare il tentativo."""
+        with _immediate(self.conn):
+            self.conn.execute(
+                "UPDATE lavori SET stato = 'attesa', worker = NULL, scadenza = NULL, tentativi = tentativi - 1 "
+                f"WHERE {self._DEL_LEASE}", (job.categoria, job.pagina, job.worker, job.scadenza))
+
+    def skip_after(self, categoria, pagina, reason):
+        """Fine catalogo a `pagina`: le pagine successive non ancora fatte della categoria si saltano."""
+        with _immediate(self.conn):
+            cur = self.conn.execute(
+                "UPDATE lavori SET stato = 'saltato', errore = ?, aggiornato = ? "
+                "WHERE categoria = ? AND pagina > ? AND stato IN ('attesa', 'captcha', 'fallito')",
+                (reason, time.time(), categoria, pagina))
+        return cur.rowcount
+
+    def requeue(self, stato="captcha"):
+        """Rimette in coda i lavori nello stato indicato (di solito la lista dei captcha). Ritorna quanti."""
+        with _immediate(self.conn):
+            cur = self.conn.execute(
+                "UPDATE lavori SET stato = 'attesa', tentativi = 0, disponibile_da = 0, aggiornato = ? "
+                "WHERE stato = ?", (time.time(), stato))
+        return cur.rowcount
+
+    # --- STATO ---
+    def counts(self):
+        conteggi = dict.fromkeys(STATI, 0)
+        conteggi.update(self.conn.execute("SELECT stato, COUNT(*) FROM lavori GROUP BY stato"))
+        return conteggi
+
+    def remaining(self):
+        """Lavori ancora da fare o in corso (anche quelli in attesa di un nuovo tentativo)."""
+        return self.conn.execute("SELECT COUNT(*) FROM lavori WHERE stato IN ('attesa', 'in_corso')").fetchone()[0]
+
+    def jobs(self, stato):
+        """(categoria, pagina, tentativi, errore) dei lavori nello stato indicato."""
+        return self.conn.execute(
+            "SELECT categoria, pagina, tentativi, errore FROM lavori WHERE stato = ? ORDER BY ordine, pagina",
+            (stato,)).fetchall()
+
+    def book_count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM libri").fetchone()[0]
+
+    def export_csv(self, path):
+        """Esporta i libri nel CSV usato dall'app, ordinati per Categoria e Recensioni."""
+        df = pd.read_sql_query(f"SELECT {', '.join(COLUMNS)} FROM libri ORDER BY Categoria, Recensioni DESC", self.conn)
+        df.to_csv(path, index=False, encoding='utf-8')
+        print(f"✅ Esportazione CSV: {len(df)} righe in {path}.")
+
+    def report(self):
+        conteggi = self.counts()
+        print(" | ".join(f"{stato}: {n}" for stato, n in conteggi.items()) + f" | libri: {self.book_count()}")
+
+    def close(self):
+        self.conn.close()
+
+
+class SharedPacer(AdaptivePacer):
+    """AdaptivePacer con lo stato nel database della coda: un solo ritmo per tutti i worker.
+
+    Il prossimo turno libero e la pausa corrente sono nella tabella ritmo; ogni wait() prenota un
+    turno in una transazione, ogni record() aggiorna la pausa per tutti. La pausa non scende mai
+    sotto il minimo impostato con CrawlQueue.set_rate. Gli orologi delle macchine devono essere
+    sincronizzati (si usa time.time()).
+    """
+
+    def __init__(self, path=QUEUE_FILE, **kwargs):
+        super().__init__(**kwargs)
+        self.conn = _connect(path)
+        self.conn.executescript(CrawlQueue.SCHEMA)
+        with _immediate(self.conn):
+            self.conn.execute("INSERT OR IGNORE INTO ritmo (id, prossimo, intervallo, minimo) VALUES (1, 0, ?, ?)",
+                              (self.delay, self.min_delay))
+
+    def wait(self):
+        with _immediate(self.conn):
+            prossimo, self.delay = self.conn.execute("SELECT prossimo, intervallo FROM ritmo").fetchone()
+            now = time.time()
+            slot = max(now, prossimo)
+            step = self.delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+            self.conn.execute("UPDATE ritmo SET prossimo = ?", (slot + step,))
+        pause = slot - now
+        if pause > 0:
+            time.sleep(pause)
+        with self._lock:
+            self.total_wait += pause
+        return pause
+
+    def record(self, elapsed, blocked=False):
+        with _immediate(self.conn):
+            self.delay, self.min_delay = self.conn.execute("SELECT intervallo, minimo FROM ritmo").fetchone()
+            super().record(elapsed, blocked)
+            self.conn.execute("UPDATE ritmo SET intervallo = ?", (self.delay,))
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    # Gestione della coda: stato, lista dei captcha, rimessa in coda, ritmo globale, esportazione
+    #   python crawl_queue.py status
+    #   python crawl_queue.py list captcha
+    #   python crawl_queue.py requeue captcha      (dopo aver risolto i captcha; poi worker --interactive)
+    #   python crawl_queue.py rate 30              (massimo 30 pagine al minuto per tutti i worker)
+    #   python crawl_queue.py export amazon_libri_multicat.csv
+    parser = argparse.ArgumentParser(description="Gestione della coda di lavoro del crawl")
+    parser.add_argument("command", choices=["status", "list", "requeue", "rate", "export"])
+    parser.add_argument("arg", nargs="?", default=None,
+                        help="list/requeue: stato (default captcha); rate: pagine al minuto; export: file CSV")
+    parser.add_argument("--queue", default=QUEUE_FILE, help=f"File della coda (default: {QUEUE_FILE})")
+    args = parser.parse_args()
+    if not os.path.exists(args.queue):
+        sys.exit(f"Coda non trovata: {args.queue}")
+
+    coda = CrawlQueue(args.queue)
+    if args.command == "status":
+        coda.report()
+    elif args.command == "list":
+        for categoria, pagina, tentativi, errore in coda.jobs(args.arg or "captcha"):
+            print(f"{categoria} p.{pagina} ({tentativi} tentativi): {errore or '-'}")
+    elif args.command == "requeue":
+        print(f"{coda.requeue(args.arg or 'captcha')} lavori rimessi in coda.")
+    elif args.command == "rate":
+        if args.arg is None:
+            sys.exit("Indica le pagine al minuto, es. python crawl_queue.py rate 30")
+        coda.set_rate(60 / float(args.arg))
+        print(f"Ritmo massimo: {float(args.arg):g} pagine al minuto per tutta la coda.")
+    elif args.command == "export":
+        coda.export_csv(args.arg or "amazon_libri_multicat.csv")
+    coda.close()
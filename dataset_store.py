@@ -0,0 +1,196 @@
+import os
+import sqlite3
+import pandas as pd
+
+# --- ARCHIVIO DEI LIBRI ESTRATTI ---
+# Due backend con la stessa interfaccia (append / asins / read_sorted / finalize / export_csv):
+#   CsvStore    -> il CSV storico: accoda pagina per pagina e riordina tutto a fine crawl
+#   SqliteStore -> tabella con ASIN univoco e indice su (Categoria, Recensioni): le letture
+#                  escono già ordinate e non serve nessuna riscrittura finale
+# BufferedWriter raggruppa le pagine e le scrive in un'unica transazione.
+
+COLUMNS = ['ASIN', 'Copertina', 'Titolo', 'Autore', 'Data', 'Recensioni', 'Categoria']
+STORE_BACKENDS = ("csv", "sqlite")
+
+
+def append_to_csv(data_list, filename):
+    """Salva i dati della singola pagina accodandoli al CSV esistente."""
+    if not data_list: return
+    df = pd.DataFrame(data_list)
+
+    # Se il file non esiste, aggiunge l'header; altrimenti accoda solo i dati
+    file_exists = os.path.isfile(filename)
+    df.to_csv(filename, mode='a', header=not file_exists, index=False, encoding='utf-8')
+
+def sort_final_csv(filename, dedupe=False):
+    """Alla fine dello scraping, legge il CSV, lo ordina e lo sovrascrive.
+
+    Con dedupe=True tiene solo l'ultima riga di ogni ASIN (aggiornamenti del crawl incrementale).
+    """
+    if os.path.exists(filename):
+        print(f"\n--- Riordino finale del file CSV: {filename} ---")
+        df = pd.read_csv(filename)
+        if dedupe:
+            df = df.drop_duplicates(subset=['ASIN'], keep='last')
+        df = df.sort_values(by=['Categoria', 'Recensioni'], ascending=[True, False])
+        df.to_csv(filename, index=False, encoding='utf-8')
+        print(f"✅ File CSV ordinato e completato correttamente: {len(df)} righe totali.")
+
+
+class CsvStore:
+    name = "csv"
+
+    def __init__(self, path):
+        self.path = path
+
+    def append(self, rows, replace=False):
+        # Il CSV non si aggiorna sul posto: le righe modificate si accodano e finalize()
+        # tiene l'ultima versione di ogni ASIN
+        append_to_csv([{c: row[c] for c in COLUMNS} for row in rows], self.path)
+
+    def asins(self):
+        """ASIN già salvati (vuoto se il file non esiste)."""
+        if not os.path.exists(self.path): return set()
+        try:
+            return set(pd.read_csv(self.path, usecols=['ASIN'], dtype=str)['ASIN'].dropna())
+        except (ValueError, pd.errors.EmptyDataError):
+            return set()
+
+    def read_sorted(self):
+        if not os.path.exists(self.path): return pd.DataFrame(columns=COLUMNS)
+        df = pd.read_csv(self.path)
+        return df.sort_values(by=['Categoria', 'Recensioni'], ascending=[True, False])
+
+    def finalize(self):
+        sort_final_csv(self.path, dedupe=True)
+
+    def export_csv(self, path):
+        if os.path.abspath(path) != os.path.abspath(self.path):
+            self.read_sorted().to_csv(path, index=False, encoding='utf-8')
+
+    def reset(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def close(self):
+        pass
+
+
+class SqliteStore:
+    name = "sqlite"
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS libri (
+            ASIN       TEXT PRIMARY KEY,
+            Copertina  TEXT,
+            Titolo     TEXT,
+            Autore     TEXT,
+            Data       TEXT,
+            Recensioni INTEGER NOT NULL,
+            Categoria  TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_libri_categoria_recensioni
+            ON libri (Categoria, Recensioni DESC);
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._connect()
+
+    def _connect(self):
+        # Accesso serializzato da CrawlOutput: la connessione può passare da un thread all'altro
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+
+    def append(self, rows, replace=False):
+        """Inserisce le righe; con replace=True aggiorna quelle già presenti (la categoria resta la prima)."""
+        if not rows: return
+        if replace:
+            aggiornabili = [c for c in COLUMNS if c not in ('ASIN', 'Categoria')]
+            conflict = "DO UPDATE SET " + ", ".join(f"{c} = excluded.{c}" for c in aggiornabili)
+        else:
+            conflict = "DO NOTHING"
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT INTO libri ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))}) "
+                f"ON CONFLICT(ASIN) {conflict}",
+                [tuple(row[c] for c in COLUMNS) for row in rows],
+            )
+
+    def asins(self):
+        return {r[0] for r in self.conn.execute("SELECT ASIN FROM libri")}
+
+    def read_sorted(self, category=None):
+        """Legge i libri già ordinati per Categoria e Recensioni decrescenti (dall'indice)."""
+        query = f"SELECT {', '.join(COLUMNS)} FROM libri"
+        params = ()
+        if category is not None:
+            query += " WHERE Categoria = ?"
+            params = (category,)
+        query += " ORDER BY Categoria, Recensioni DESC"
+        return pd.read_sql_query(query, self.conn, params=params)
+
+    def finalize(self):
+        # Nessun riordino: aggiorna solo le statistiche dell'ottimizzatore
+        with self.conn:
+            self.conn.execute("ANALYZE")
+        count = self.conn.execute("SELECT COUNT(*) FROM libri").fetchone()[0]
+        print(f"✅ Archivio SQLite completato: {count} righe totali in {self.path}.")
+
+    def export_csv(self, path):
+        df = self.read_sorted()
+        df.to_csv(path, index=False, encoding='utf-8')
+        print(f"✅ Esportazione CSV: {len(df)} righe in {path}.")
+
+    def reset(self):
+        self.conn.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+        self._connect()
+
+    def close(self):
+        self.conn.close()
+
+
+def open_store(path, backend="csv"):
+    if backend == "csv":
+        return CsvStore(path)
+    if backend == "sqlite":
+        return SqliteStore(path)
+    raise ValueError(f"Backend di archiviazione sconosciuto: {backend}")
+
+
+class BufferedWriter:
+    """Accumula pagine di libri e le scrive in blocco ogni `batch_pages` pagine.
+
+    on_flush(records) viene chiamato dopo ogni scrittura riuscita con i record delle pagine
+    appena salvate: così il giornale non segna mai come completata una pagina non ancora su disco.
+    """
+
+    def __init__(self, store, batch_pages=1, on_flush=None, replace=False):
+        self.store = store
+        self.batch_pages = max(1, batch_pages)
+        self.on_flush = on_flush
+        self.replace = replace
+        self.rows = []
+        self.records = []
+        self.pending_pages = 0
+
+    def add(self, rows, record=None):
+        self.rows.extend(rows)
+        if record is not None:
+            self.records.append(record)
+        self.pending_pages += 1
+        if self.pending_pages >= self.batch_pages:
+            self.flush()
+
+    def flush(self):
+        if not self.pending_pages: return
+        self.store.append(self.rows, replace=self.replace)
+        records = self.records
+        self.rows, self.records, self.pending_pages = [], [], 0
+        if self.on_flush is not None:
+            self.on_flush(records)
@@ -0,0 +1,134 @@
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from card_extractor import is_captcha_page, RESULT_COMPONENT
+
+# --- FETCH VIA HTTP CON RIPIEGO SUL BROWSER ---
+# Le card dei risultati sono già nell'HTML generato dal server: quasi sempre basta una
+# richiesta HTTP su connessione keep-alive. Il browser Selenium entra in gioco solo se
+# la risposta è un captcha, un errore o una pagina senza card.
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "it-IT,it;q=0.9,en;q=0.6",
+}
+
+
+def needs_browser(status_code, html):
+    """True se la risposta HTTP non è utilizzabile e la pagina va aperta nel browser."""
+    if status_code != 200: return True
+    if is_captcha_page(html): return True
+    return RESULT_COMPONENT not in html
+
+
+class HttpFetcher:
+    def __init__(self, fallback=None, pool_size=8, concurrency=1, timeout=20,
+                 pacer=None, base_url=None, headers=None, metrics=None):
+        """
+        fallback: oggetto con .fetch(url) (es. BrowserFetcher) usato quando l'HTTP non basta.
+        pacer: AdaptivePacer che distanzia le richieste (None = nessuna pausa, es. server stub).
+        concurrency: richieste in volo contemporaneamente in fetch_many.
+        base_url: se indicato sostituisce schema e host (es. server stub locale per i test).
+        metrics: CrawlMetrics che riceve i tempi di attesa e di download di ogni URL.
+        """
+        self.fallback = fallback
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.pacer = pacer
+        self.base_url = base_url
+        self.metrics = metrics
+        self.stats = {"http": 0, "browser": 0}
+        self._stats_lock = threading.Lock()
+
+        self.session = requests.Session()
+        self.session.headers.update(headers or DEFAULT_HEADERS)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(pool_size, self.concurrency))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _rewrite(self, url):
+        if not self.base_url: return url
+        base = urlsplit(self.base_url)
+        parts = urlsplit(url)
+        return urlunsplit((base.scheme, base.netloc, parts.path, parts.query, parts.fragment))
+
+    def _count(self, source):
+        with self._stats_lock:
+            self.stats[source] += 1
+
+    def fetch(self, url):
+        """Scarica una pagina e ne ritorna l'HTML, ripiegando sul browser se serve."""
+        status_code, html = self.get(url)
+        if needs_browser(status_code, html) and self.fallback is not None:
+            self._count("browser")
+            return self.fallback.fetch(url)
+
+        self._count("http")
+        return html
+
+    def get(self, url):
+        """Una sola richiesta HTTP, senza ripiego: ritorna (status, html); status None se la rete fallisce."""
+        if self.pacer is not None:
+            attesa = self.pacer.wait()
+            if self.metrics is not None:
+                self.metrics.add(url, "attesa", attesa)
+        inizio = time.monotonic()
+        try:
+            response = self.session.get(self._rewrite(url), timeout=self.timeout)
+            status_code, html = response.status_code, response.text
+        except requests.RequestException as e:
+            ripiego = ", uso il browser" if self.fallback is not None else ""
+            print(f"  -> HTTP non riuscito ({e.__class__.__name__}){ripiego}.")
+            status_code, html = None, ""
+        if self.metrics is not None:
+            self.metrics.add(url, "http", time.monotonic() - inizio)
+            if is_captcha_page(html):
+                self.metrics.count(url, "captcha")
+
+        if self.pacer is not None:
+            # Captcha, rifiuti (429/503) ed errori di rete fanno rallentare tutto il crawl
+            blocked = status_code is None or status_code in (429, 503) or is_captcha_page(html)
+            self.pacer.record(time.monotonic() - inizio, blocked=blocked)
+        return status_code, html
+
+    def fetch_many(self, urls):
+        """Genera (url, html) nell'ordine di urls con al massimo `concurrency` richieste in volo.
+
+        Se il consumatore interrompe il ciclo, le richieste non ancora partite vengono annullate.
+        """
+        if self.concurrency == 1:
+            for url in urls:
+                yield url, self.fetch(url)
+            return
+
+        urls = iter(urls)
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            try:
+                for url in urls:
+                    pending.append((url, pool.submit(self.fetch, url)))
+                    if len(pending) >= self.concurrency:
+                        break
+                while pending:
+                    url, future = pending.popleft()
+                    html = future.result()
+                    # Finestra scorrevole: una nuova richiesta per ogni pagina consegnata
+                    for next_url in urls:
+                        pending.append((next_url, pool.submit(self.fetch, next_url)))
+                        break
+                    yield url, html
+            finally:
+                for _, future in pending:
+                    future.cancel()
+
+    def close(self):
+        self.session.close()
+        if self.fallback is not None:
+            self.fallback.close()
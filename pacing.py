@@ -0,0 +1,90 @@
+import time
+import random
+import threading
+
+# --- RITMO ADATTIVO DELLE RICHIESTE ---
+# Al posto delle pause fisse, un unico pacer condiviso da tutti i fetcher distanzia l'inizio
+# delle richieste: accelera finché le risposte sono pulite e rallenta quando compaiono
+# captcha, errori o caricamenti lenti. Essendo condiviso, il limite vale per tutto il crawl.
+
+
+class AdaptivePacer:
+    def __init__(self, initial_delay=3.0, min_delay=0.5, max_delay=30.0,
+                 speedup=0.9, backoff=2.0, slow_threshold=8.0, jitter=0.2):
+        self.delay = initial_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.speedup = speedup
+        self.backoff = backoff
+        self.slow_threshold = slow_threshold
+        self.jitter = jitter
+        self.total_wait = 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Attende il prossimo turno libero. Ritorna i secondi di attesa effettivi."""
+        with self._lock:
+            now = time.monotonic()
+            step = self.delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + step
+        pause = slot - now
+        if pause > 0:
+            time.sleep(pause)
+        with self._lock:
+            self.total_wait += pause
+        return pause
+
+    def record(self, elapsed, blocked=False):
+        """Aggiorna il ritmo dopo una risposta: blocked = captcha o errore del server."""
+        with self._lock:
+            if blocked:
+                self.delay = min(self.max_delay, self.delay * self.backoff)
+            elif elapsed > self.slow_threshold:
+                self.delay = min(self.max_delay, self.delay * (1 + self.backoff) / 2)
+            else:
+                self.delay = max(self.min_delay, self.delay * self.speedup)
+
+
+class CrawlStats:
+    """Statistiche per categoria: pagine scaricate, durata e pagine risparmiate con lo stop anticipato."""
+
+    def __init__(self, page_budget):
+        self.page_budget = page_budget
+        self.categorie = {}
+        self._lock = threading.Lock()
+
+    def _cat(self, category):
+        return self.categorie.setdefault(category, {
+            "pagine": 0, "secondi": 0.0, "nuovi": 0, "ultima_pagina": 0, "stop": None,
+        })
+
+    def record_page(self, category, page, seconds, nuovi):
+        with self._lock:
+            c = self._cat(category)
+            c["pagine"] += 1
+            c["secondi"] += seconds
+            c["nuovi"] += nuovi
+            c["ultima_pagina"] = max(c["ultima_pagina"], page)
+
+    def record_stop(self, category, page, reason):
+        with self._lock:
+            self._cat(category)["stop"] = (page, reason)
+
+    def report(self, pacer=None):
+        print(f"\n{'='*20} RIEPILOGO CRAWL {'='*20}")
+        totale_risparmiato = 0.0
+        for category, c in self.categorie.items():
+            media = c["secondi"] / c["pagine"] if c["pagine"] else 0.0
+            riga = f"{category}: {c['pagine']} pagine in {c['secondi']/60:.1f} min ({media:.1f} s/pagina), {c['nuovi']} libri nuovi"
+            if c["stop"] is not None:
+                page, reason = c["stop"]
+                saltate = max(0, self.page_budget - page)
+                risparmio = saltate * media
+                totale_risparmiato += risparmio
+                riga += f" | stop a p.{page} ({reason}): {saltate} pagine saltate, ~{risparmio/60:.1f} min risparmiati"
+            print(riga)
+        print(f"Tempo risparmiato dallo stop anticipato: ~{totale_risparmiato/60:.1f} min")
+        if pacer is not None:
+            print(f"Attesa totale tra le richieste: {pacer.total_wait/60:.1f} min (ritmo finale: {pacer.delay:.1f} s/richiesta)")
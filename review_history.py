@@ -0,0 +1,158 @@
+import os
+import time
+import sqlite3
+import pandas as pd
+
+# --- STORICO DELLE RECENSIONI PER ASIN ---
+# Tre tabelle SQLite:
+#   storico  -> append-only (asin, ts, recensioni, posizione): una riga solo quando qualcosa cambia
+#   ultimo   -> ultima osservazione per ASIN, per capire subito se una riga è cambiata
+#   velocita -> "velocità" delle recensioni precalcolata a ogni osservazione, così scraper e app
+#               ordinano per crescita senza mai scorrere lo storico completo
+# La velocità è misurata su una finestra che termina al run corrente (ultimi window_days giorni,
+# o dalla prima osservazione se il libro è più recente): un libro che smette di ricevere
+# recensioni rallenta a ogni run, anche se il suo conteggio non cambia più.
+
+HISTORY_FILE = "review_history.sqlite"
+SECONDI_GIORNO = 86400.0
+VELOCITY_WINDOW_DAYS = 30
+
+
+class ReviewHistory:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS storico (
+            asin       TEXT NOT NULL,
+            ts         INTEGER NOT NULL,
+            recensioni INTEGER NOT NULL,
+            posizione  INTEGER,
+            PRIMARY KEY (asin, ts)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS ultimo (
+            asin       TEXT PRIMARY KEY,
+            ts         INTEGER NOT NULL,
+            recensioni INTEGER NOT NULL,
+            posizione  INTEGER
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS velocita (
+            asin       TEXT PRIMARY KEY,
+            recensioni INTEGER NOT NULL,
+            delta      INTEGER NOT NULL,
+            giorni     REAL NOT NULL,
+            per_giorno REAL NOT NULL,
+            aggiornato INTEGER NOT NULL
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_velocita_per_giorno ON velocita (per_giorno DESC);
+    """
+
+    def __init__(self, path=HISTORY_FILE, run_ts=None, window_days=VELOCITY_WINDOW_DAYS):
+        self.path = path
+        # Tutte le osservazioni di un run condividono lo stesso istante
+        self.run_ts = int(run_ts if run_ts is not None else time.time())
+        self.window_days = window_days
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(self.SCHEMA)
+        self.ultimo = {
+            asin: (ts, recensioni, posizione)
+            for asin, ts, recensioni, posizione in self.conn.execute("SELECT asin, ts, recensioni, posizione FROM ultimo")
+        }
+        self.inizio_finestra = self._window_start()
+        self.cambiati = 0
+        self.invariati = 0
+        self._pending = ([], [], [])
+
+    def _window_start(self):
+        """Per ogni ASIN (ts, recensioni) all'inizio della finestra della velocità.
+
+        Il conteggio all'inizio della finestra è quello dell'ultima riga dello storico non successiva;
+        per i libri visti la prima volta dentro la finestra vale la prima osservazione.
+        """
+        inizio = self.run_ts - int(self.window_days * SECONDI_GIORNO)
+        # MIN/MAX con colonne semplici: SQLite restituisce i valori della riga con il minimo/massimo
+        finestra = {asin: (ts, recensioni) for asin, ts, recensioni in self.conn.execute(
+            "SELECT asin, MIN(ts), recensioni FROM storico GROUP BY asin")}
+        finestra.update((asin, (inizio, recensioni)) for asin, _, recensioni in self.conn.execute(
+            "SELECT asin, MAX(ts), recensioni FROM storico WHERE ts <= ? GROUP BY asin", (inizio,)))
+        return finestra
+
+    def observe(self, books):
+        """Confronta le osservazioni di una pagina con l'ultimo stato e ritorna i libri nuovi o con
+        recensioni cambiate. Le righe dello storico restano in sospeso fino a flush().
+
+        Ogni libro deve avere 'ASIN', 'Recensioni' e, se disponibile, 'Posizione'.
+        """
+        storico, ultimo, velocita = self._pending
+        modificati = []
+        for book in books:
+            asin, recensioni, posizione = book['ASIN'], int(book['Recensioni']), book.get('Posizione')
+            # Velocità sulla finestra che termina adesso, anche se il conteggio non è cambiato
+            ts_inizio, recensioni_inizio = self.inizio_finestra.get(asin, (self.run_ts, recensioni))
+            if self.run_ts > ts_inizio:
+                giorni = (self.run_ts - ts_inizio) / SECONDI_GIORNO
+                delta = recensioni - recensioni_inizio
+                velocita.append((asin, recensioni, delta, giorni, delta / giorni, self.run_ts))
+
+            prev = self.ultimo.get(asin)
+            if prev is not None and prev[1] == recensioni and prev[2] == posizione:
+                self.invariati += 1
+                continue
+
+            self.cambiati += 1
+            storico.append((asin, self.run_ts, recensioni, posizione))
+
+            if prev is None or prev[1] != recensioni:
+                modificati.append(book)
+                ts_conteggio = self.run_ts
+            else:
+                # È cambiata solo la posizione: resta l'istante dell'ultimo conteggio diverso
+                ts_conteggio = prev[0]
+
+            self.ultimo[asin] = (ts_conteggio, recensioni, posizione)
+            ultimo.append((asin, ts_conteggio, recensioni, posizione))
+
+        return modificati
+
+    def flush(self):
+        """Scrive lo storico in sospeso. Va chiamata dopo aver salvato le righe del dataset:
+        se il crawl si interrompe prima, al prossimo run quelle righe risultano ancora cambiate."""
+        storico, ultimo, velocita = self._pending
+        if not storico and not velocita: return
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO storico VALUES (?, ?, ?, ?)", storico)
+            self.conn.executemany("INSERT OR REPLACE INTO ultimo VALUES (?, ?, ?, ?)", ultimo)
+            self.conn.executemany("INSERT OR REPLACE INTO velocita VALUES (?, ?, ?, ?, ?, ?)", velocita)
+        self._pending = ([], [], [])
+
+    def top_velocity(self, limit=10):
+        return read_velocity(self.conn, limit)
+
+    def report(self, limit=10):
+        print(f"\n--- Storico recensioni: {self.cambiati} osservazioni cambiate, {self.invariati} invariate ---")
+        top = self.top_velocity(limit)
+        if top.empty: return
+        print("Libri che crescono più in fretta (recensioni/giorno):")
+        for row in top.itertuples():
+            print(f"  {row.ASIN}: +{row.Delta} in {row.Giorni:.1f} giorni ({row.Crescita:.1f}/giorno)")
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+
+def read_velocity(source=HISTORY_FILE, limit=None):
+    """Legge la vista precalcolata: ASIN, Crescita (recensioni/giorno), Delta, Giorni, ordinata per crescita.
+
+    source può essere un percorso o una connessione già aperta; se il file non esiste ritorna un DataFrame vuoto.
+    """
+    colonne = ['ASIN', 'Crescita', 'Delta', 'Giorni']
+    if isinstance(source, str):
+        if not os.path.exists(source): return pd.DataFrame(columns=colonne)
+        conn = sqlite3.connect(source)
+    else:
+        conn = source
+    try:
+        query = "SELECT asin AS ASIN, per_giorno AS Crescita, delta AS Delta, giorni AS Giorni FROM velocita ORDER BY per_giorno DESC"
+        if limit: query += f" LIMIT {int(limit)}"
+        return pd.read_sql_query(query, conn)
+    finally:
+        if isinstance(source, str): conn.close()
@@ -1,20 +1,38 @@
 import sys
 import time
 import os
-import pandas as pd
-import re
-import random
+import argparse
+import contextlib
+import queue
+import signal
+import socket
+import threading
+from multiprocessing import Pool, Process
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import SessionNotCreatedException, TimeoutException, WebDriverException
 from webdriver_manager.chrome import ChromeDriverManager
-from bs4 import BeautifulSoup
+from card_extractor import RESULT_COMPONENT, CardExtractor, is_captcha_page, has_next_page, DEFAULT_BACKEND, BACKENDS
+from crawl_journal import CrawlJournal, journal_path_for
+from dataset_store import CsvStore, BufferedWriter, open_store, STORE_BACKENDS
+from http_fetcher import HttpFetcher
+from pacing import AdaptivePacer, CrawlStats
+from review_history import ReviewHistory, HISTORY_FILE
+from snapshot_store import SnapshotStore, DEFAULT_SNAPSHOT_DIR, read_snapshot
+from crawl_metrics import CrawlMetrics, metrics_path_for
+from crawl_queue import CrawlQueue, SharedPacer, QUEUE_FILE, LEASE_SECONDS, MAX_ATTEMPTS
+from cover_cache import CoverCache, CoverPrefetcher, COVER_CACHE_DIR, DEFAULT_MAX_MB
 
 # --- CONFIGURAZIONE ---
 NUM_PAGINE_PER_CATEGORIA = 300  # 300 pagine per ogni categoria
 MIN_RECENSIONI = 60             # Soglia minima recensioni
 OUTPUT_FILE = "amazon_libri_multicat.csv" # Nome del file di salvataggio
+SQLITE_FILE = "amazon_libri_multicat.sqlite" # Archivio indicizzato (--store sqlite)
+MAX_PAGINE_SENZA_NUOVI = 8      # Stop anticipato della categoria dopo N pagine di fila senza ASIN mai visti
+PIPELINE_QUEUE_PAGES = 8        # Pagine scaricate in attesa di parsing/scrittura nel crawl a pipeline
 
 # --- DEFINIZIONE CATEGORIE ---
 CATEGORIES = [
@@ -54,20 +72,85 @@ CATEGORIES = [
 if sys.stdout.encoding != 'utf-8':
     sys.stdout.reconfigure(encoding='utf-8')
 
-def setup_driver():
+# --- PROFILI DEL BROWSER ---
+# "lean" (default): headless, caricamento "eager", immagini/media/font bloccati via CDP e attesa
+#   delle card al posto delle pause fisse. I captcha si risolvono in una finestra visibile.
+# "classic": il browser visibile e completo di sempre.
+BROWSER_PROFILES = ("lean", "classic")
+BLOCKED_RESOURCES = ["*.jpg", "*.jpeg", "*.png", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico",
+                     "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot", "*.mp4", "*.webm", "*.m3u8", "*.mp3"]
+RESULT_SELECTOR = f'div[data-component-type="{RESULT_COMPONENT}"]'
+PAGE_LOAD_TIMEOUT = 15
+# Percorso di chromedriver già scaricato: evita il controllo di versione in rete a ogni avvio
+CHROMEDRIVER_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "amazon_scraper_chromedriver.txt")
+
+_chromedriver_path = None
+
+def chromedriver_path(refresh=False):
+    """chromedriver da variabile CHROMEDRIVER, dalla cache su disco o, solo se serve, scaricato."""
+    global _chromedriver_path
+    if _chromedriver_path and not refresh:
+        return _chromedriver_path
+    path = None if refresh else os.environ.get("CHROMEDRIVER")
+    if not path and not refresh and os.path.exists(CHROMEDRIVER_CACHE_FILE):
+        with open(CHROMEDRIVER_CACHE_FILE, encoding='utf-8') as f:
+            path = f.read().strip()
+    if not path or not os.path.exists(path):
+        path = ChromeDriverManager().install()
+        os.makedirs(os.path.dirname(CHROMEDRIVER_CACHE_FILE), exist_ok=True)
+        with open(CHROMEDRIVER_CACHE_FILE, "w", encoding='utf-8') as f:
+            f.write(path)
+    _chromedriver_path = path
+    return path
+
+def setup_driver(profile="classic"):
+    lean = profile == "lean"
     chrome_options = Options()
-    chrome_options.add_argument("--start-maximized")
+    if lean:
+        chrome_options.add_argument("--headless=new")
+        chrome_options.add_argument("--window-size=1366,900")
+        chrome_options.add_argument("--disable-extensions")
+        # Il DOM delle card c'è già a DOMContentLoaded: non si aspettano immagini e script di terze parti
+        chrome_options.page_load_strategy = "eager"
+        chrome_options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+    else:
+        chrome_options.add_argument("--start-maximized")
     chrome_options.add_argument("--disable-blink-features=AutomationControlled")
     chrome_options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36")
     chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
     chrome_options.add_experimental_option('useAutomationExtension', False)
 
-    service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=chrome_options)
+    try:
+        driver = webdriver.Chrome(service=Service(chromedriver_path()), options=chrome_options)
+    except SessionNotCreatedException:
+        # Chrome aggiornato: il driver in cache non è più compatibile, se ne scarica uno nuovo
+        driver = webdriver.Chrome(service=Service(chromedriver_path(refresh=True)), options=chrome_options)
+
+    if lean:
+        driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT * 2)
+        # Blocco delle risorse a livello di rete: non vengono nemmeno richieste
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_RESOURCES})
     return driver
 
-def check_captcha(driver, soup):
-    if soup.find('input', id='captchacharacters') or "inserisci i caratteri" in soup.get_text().lower():
+def wait_for_results(driver, timeout=PAGE_LOAD_TIMEOUT):
+    """Attende le card dei risultati (o la fine del caricamento: captcha, pagina vuota) e ritorna l'HTML."""
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=0.2).until(
+            lambda d: d.find_elements(By.CSS_SELECTOR, RESULT_SELECTOR)
+            or d.execute_script("return document.readyState") == "complete"
+        )
+    except TimeoutException:
+        pass
+    return driver.page_source
+
+# Con più browser in parallelo i captcha vanno risolti uno alla volta
+_captcha_lock = threading.Lock()
+
+def check_captcha(driver, html):
+    if not is_captcha_page(html):
+        return False
+    with _captcha_lock:
         print("\n" + "!"*50)
         print("⚠️  AMAZON CAPTCHA RILEVATO!  ⚠️")
         print("Vai sul browser, risolvilo e poi premi INVIO qui.")
@@ -76,162 +159,891 @@ def check_captcha(driver, soup):
         driver.refresh()
         time.sleep(3)
         return True
+
+class CrawlOutput:
+    """Deduplica gli ASIN e salva le pagine nell'archivio. Sicura da condividere tra più thread."""
+
+    def __init__(self, store, journal=None, batch_pages=1, history=None, covers=None):
+        # Compatibilità: un percorso semplice indica il CSV storico
+        self.store = CsvStore(store) if isinstance(store, str) else store
+        self.journal = journal
+        self.history = history
+        # CoverPrefetcher opzionale: le copertine dei libri nuovi si scaricano in background
+        self.covers = covers
+        self.visti_asin = set()
+        # Tutti gli ASIN incontrati, anche quelli scartati dai filtri: misurano se la categoria offre ancora novità
+        self.incontrati = set()
+        self.pagine_stop = dict(journal.pagine_stop) if journal is not None else {}
+        self._lock = threading.Lock()
+        # Crawl incrementale (history): le righe cambiate sostituiscono quelle già salvate
+        self.writer = BufferedWriter(self.store, batch_pages, on_flush=self._record_pages, replace=history is not None)
+        if journal is not None:
+            # Ripresa: il set di deduplica riparte dal giornale e da quanto è già nell'archivio.
+            # In modalità incrementale l'archivio contiene anche i run precedenti, quindi conta solo il giornale.
+            self.visti_asin.update(journal.visti_asin)
+            if history is None:
+                self.visti_asin.update(self.store.asins())
+        self.incontrati.update(self.visti_asin)
+
+    def _record_pages(self, records):
+        # Ordine delle scritture: dataset (già fatto), storico, giornale
+        if self.history is not None:
+            self.history.flush()
+        if self.journal is not None and records:
+            self.journal.record_pages(records)
+
+    def observe_asins(self, asins):
+        """Registra gli ASIN di una pagina (prima dei filtri) e ritorna quanti non erano mai comparsi."""
+        with self._lock:
+            mai_visti = set(asins) - self.incontrati
+            self.incontrati.update(mai_visti)
+        return len(mai_visti)
+
+    def save_page(self, page_books, category=None, page=None):
+        """Accoda i libri non ancora visti e ritorna quanti ne sono stati aggiunti.
+
+        Se sono indicate categoria e pagina, la pagina viene segnata come completata nel giornale
+        non appena il blocco che la contiene è stato scritto.
+        """
+        with self._lock:
+            nuovi = []
+            for book in page_books:
+                if book['ASIN'] in self.visti_asin: continue
+                self.visti_asin.add(book['ASIN'])
+                nuovi.append(book)
+            record = (category, page, [book['ASIN'] for book in nuovi]) if category is not None else None
+            # Incrementale: si riscrivono solo i libri nuovi o con recensioni cambiate
+            da_scrivere = self.history.observe(nuovi) if self.history is not None else nuovi
+            # Scrittura sotto lock: le righe di pagine diverse non si mescolano mai
+            self.writer.add(da_scrivere, record)
+        if self.covers is not None:
+            self.covers.submit(book['Copertina'] for book in nuovi)
+        return len(nuovi)
+
+    def flush(self):
+        with self._lock:
+            self.writer.flush()
+
+    def pending_pages(self, category, pages):
+        if self.journal is not None:
+            return self.journal.pending_pages(category, pages)
+        stop = self.pagine_stop.get(category)
+        return [p for p in pages if stop is None or p <= stop]
+
+    def is_past_stop(self, category, page):
+        stop = self.pagine_stop.get(category)
+        return stop is not None and page > stop
+
+    def is_category_done(self, category):
+        return self.journal is not None and self.journal.is_category_done(category)
+
+    def mark_category_stop(self, category, page):
+        """Fine catalogo a `page`: le pagine successive si saltano, quelle precedenti restano da fare."""
+        with self._lock:
+            self.pagine_stop[category] = min(page, self.pagine_stop.get(category, page))
+        if self.journal is not None:
+            # Prima le pagine in sospeso, poi lo stop: il giornale resta coerente con il disco
+            self.flush()
+            self.journal.record_category_stop(category, page)
+
+# --- FETCH CON IL BROWSER ---
+# ChromeDriverManager non regge installazioni concorrenti: i driver si creano uno alla volta
+_driver_setup_lock = threading.Lock()
+
+class BrowserFetcher:
+    """Apre le pagine con Selenium. Il driver viene avviato solo al primo utilizzo."""
+
+    def __init__(self, driver=None, pacer=None, metrics=None, profile="lean"):
+        self.driver = driver
+        self.pacer = pacer or AdaptivePacer()
+        self.metrics = metrics
+        self.profile = profile
+        self._lock = threading.Lock()
+
+    def _add(self, url, stage, seconds):
+        if self.metrics is not None:
+            self.metrics.add(url, stage, seconds)
+
+    def fetch(self, url):
+        # Un driver Selenium non si può usare da più thread contemporaneamente
+        with self._lock:
+            if self.driver is None:
+                with _driver_setup_lock:
+                    self.driver = setup_driver(self.profile)
+            driver = self.driver
+            # Pausa adattiva al posto di quelle fisse: si allunga solo se Amazon rallenta o blocca
+            self._add(url, "attesa", self.pacer.wait())
+            inizio = time.monotonic()
+            if self.profile == "lean":
+                return self._fetch_lean(driver, url, inizio)
+            driver.get(url)
+            caricata = time.monotonic()
+            self._add(url, "browser_get", caricata - inizio)
+            driver.execute_script("window.scrollTo(0, document.body.scrollHeight/2);")
+            
+            html = driver.page_source
+            scroll = time.monotonic()
+            self._add(url, "scroll", scroll - caricata)
+            captcha = check_captcha(driver, html)
+            if captcha:
+                html = driver.page_source
+                if self.metrics is not None:
+                    self.metrics.count(url, "captcha")
+            self._add(url, "captcha", time.monotonic() - scroll)
+            self.pacer.record(scroll - inizio, blocked=captcha)
+            return html
+
+    def _fetch_lean(self, driver, url, inizio):
+        try:
+            driver.get(url)
+        except TimeoutException:
+            pass  # caricamento lento: si legge comunque quello che c'è
+        html = wait_for_results(driver)
+        caricata = time.monotonic()
+        self._add(url, "browser_get", caricata - inizio)
+        captcha = is_captcha_page(html)
+        if captcha:
+            html = self._solve_visible(url)
+            if self.metrics is not None:
+                self.metrics.count(url, "captcha")
+        self._add(url, "captcha", time.monotonic() - caricata)
+        self.pacer.record(caricata - inizio, blocked=captcha)
+        return html
+
+    def _solve_visible(self, url):
+        """Captcha in headless: la stessa pagina si apre in un browser visibile, poi se ne copiano i cookie."""
+        with _driver_setup_lock:
+            visibile = setup_driver("classic")
+        try:
+            visibile.get(url)
+            check_captcha(visibile, visibile.page_source)
+            html = wait_for_results(visibile)
+            cookies = visibile.get_cookies()
+        finally:
+            visibile.quit()
+        for cookie in cookies:
+            try:
+                self.driver.add_cookie(cookie)
+            except WebDriverException:
+                pass  # cookie di un altro dominio o con attributi non accettati
+        return html
+
+    def fetch_many(self, urls):
+        for url in urls:
+            yield url, self.fetch(url)
+
+    def close(self):
+        if self.driver is not None:
+            self.driver.quit()
+            self.driver = None
+
+def make_fetcher(mode="http", concurrency=1, base_url=None, pacer=None, metrics=None, browser_profile="lean"):
+    """Crea il fetcher del crawl: HTTP con ripiego sul browser oppure solo browser."""
+    pacer = pacer or AdaptivePacer()
+    browser = BrowserFetcher(pacer=pacer, metrics=metrics, profile=browser_profile)
+    if mode == "browser":
+        return browser
+    return HttpFetcher(fallback=browser, concurrency=concurrency,
+                       base_url=base_url, pacer=pacer, metrics=metrics)
+
+def page_url(cat, page):
+    if page == 1:
+        return cat['start']
+    return cat['template'].format(page=page)
+
+def _stop_category(output, stats, cat, page, reason):
+    print(f"⏹️  {cat['name']}: stop a pagina {page} ({reason}).")
+    output.mark_category_stop(cat['name'], page)
+    if stats is not None:
+        stats.record_stop(cat['name'], page, reason)
+    return True
+
+def _write_page(output, cat, page, num_results, page_books, scarti=None, rejected=()):
+    """Salva i libri della pagina (deduplica e giornale).
+
+    Ritorna (libri nuovi salvati, ASIN mai visti prima tra le card della pagina, scartate comprese).
+    """
+    # Posizione nella classifica della categoria, non solo nella pagina (su copie: il risultato
+    # dell'estrazione resta intatto anche se la pagina venisse riproposta)
+    offset = (page - 1) * num_results
+    page_books = [{**book, 'Posizione': book['Posizione'] + offset} for book in page_books]
+
+    if not num_results:
+        print(f"❌ {cat['name']} - Pagina {page}: nessun risultato trovato.")
+        output.save_page([], cat['name'], page)
+        return 0, 0
+    # Prima della deduplica: save_page segna come visti i libri accettati
+    mai_visti = output.observe_asins([asin for asin, _ in rejected] + [book['ASIN'] for book in page_books])
+    # Salva i libri trovati in questa pagina direttamente nel CSV (e aggiorna il giornale)
+    # Crawl a pipeline: l'estrazione non conosceva gli ASIN già salvati. Come nel crawl seriale una
+    # card già vista conta come duplicato, prima degli altri motivi di scarto
+    if scarti is not None:
+        for asin, motivo in rejected:
+            if asin in output.visti_asin:
+                scarti[motivo] -= 1
+                scarti['duplicato'] = scarti.get('duplicato', 0) + 1
+    count_ok = output.save_page(page_books, cat['name'], page)
+    duplicati = len(page_books) - count_ok
+    if scarti is not None and duplicati:
+        scarti['duplicato'] = scarti.get('duplicato', 0) + duplicati
+        scarti['accettati'] = scarti.get('accettati', 0) - duplicati
+    if scarti is not None:
+        for motivo in [m for m, n in scarti.items() if n == 0]:
+            del scarti[motivo]
+    print(f"  -> {cat['name']} p.{page}: {num_results} elementi, {count_ok} nuovi libri salvati nel CSV.")
+    return count_ok, mai_visti
+
+def _stop_reason(page, num_results, has_next, pagine_senza_nuovi):
+    """Motivo dello stop anticipato della categoria dopo questa pagina, oppure None."""
+    if not num_results and page > 5:
+        return "pagina vuota, probabile fine catalogo"
+    if num_results and has_next is False:
+        return "nessuna pagina successiva"
+    if pagine_senza_nuovi >= MAX_PAGINE_SENZA_NUOVI:
+        return f"{pagine_senza_nuovi} pagine di fila senza ASIN nuovi"
+    return None
+
+def crawl_pages(fetcher, cat, pages, extractor, output, snapshots=None, stop_event=None, stats=None,
+                metrics=None):
+    """Scansiona le pagine indicate di una categoria. Ritorna True se ha raggiunto la fine del catalogo."""
+    # Le pagine già completate in un run precedente (giornale) vengono saltate
+    pages = output.pending_pages(cat['name'], pages)
+    urls = [page_url(cat, page) for page in pages]
+    pagine_senza_nuovi = 0
+    inizio = time.monotonic()
+
+    # Il generatore viene chiuso all'uscita dal ciclo: le pagine prefetchate e non usate si annullano
+    for page, (url, html) in zip(pages, fetcher.fetch_many(urls)):
+        # Un altro blocco della stessa categoria ha trovato la fine del catalogo prima di questa pagina
+        if output.is_past_stop(cat['name'], page):
+            return True
+        print(f"\n{cat['name']} - Pagina {page}/{NUM_PAGINE_PER_CATEGORIA}...")
+
+        tempi, scarti = {}, {}
+        t0 = time.perf_counter()
+        # Modalità cattura: conserva l'HTML grezzo per poterlo rielaborare offline
+        if snapshots is not None:
+            snapshots.put(cat['name'], page, html)
+            tempi['snapshot'] = time.perf_counter() - t0
+
+        rejected = []
+        num_results, page_books = extractor.extract(html, cat['name'], output.visti_asin, scarti, tempi, rejected)
+
+        t0 = time.perf_counter()
+        count_ok, mai_visti = _write_page(output, cat, page, num_results, page_books, scarti, rejected)
+        tempi['scrittura'] = time.perf_counter() - t0
+
+        if metrics is not None:
+            metrics.record_page(cat['name'], page, url, num_results, scarti, count_ok, tempi)
+        if stats is not None:
+            stats.record_page(cat['name'], page, time.monotonic() - inizio, count_ok)
+        inizio = time.monotonic()
+
+        # --- STOP ANTICIPATO ---
+        # Conta le card mai viste prima dei filtri: pagine di libri con poche recensioni non fermano la categoria
+        pagine_senza_nuovi = pagine_senza_nuovi + 1 if mai_visti == 0 else 0
+        reason = _stop_reason(page, num_results, has_next_page(html) if num_results else None, pagine_senza_nuovi)
+        if reason:
+            return _stop_category(output, stats, cat, page, reason)
+
+        if stop_event is not None and stop_event.is_set():
+            return False
     return False
 
-def clean_reviews_count(text):
-    if not text: return 0
-    clean = re.sub(r'[^\d]', '', text)
+# --- CRAWL A PIPELINE ---
+# Fetch, parsing e scrittura si sovrappongono invece di alternarsi sullo stesso thread:
+#   fetch     -> un thread scarica le pagine e le consegna al pool di processi
+#   parsing   -> il pool estrae le card in parallelo (fuori dal GIL, senza fermare il browser)
+#   scrittura -> il thread principale, unico, riceve le pagine nell'ordine in cui sono state
+#                scaricate, deduplica gli ASIN, salva e decide lo stop anticipato
+# La coda tra fetch e scrittura è limitata: quando è piena il fetch si ferma (backpressure), quindi
+# in memoria ci sono al più queue_pages pagine. Su Ctrl-C si smette di scaricare, ma le pagine già
+# scaricate vengono elaborate e scritte prima di uscire.
+_FINE = object()       # sentinella: il fetch non produrrà altre pagine
+_parse_extractors = {}
+
+def _init_parse_worker():
+    # Il Ctrl-C lo gestisce il processo principale, che deve poter svuotare la pipeline
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def _parse_page(html, cat_name, parser):
+    """Eseguita nei processi del pool: estrae i libri candidati e la paginazione della pagina."""
+    extractor = _parse_extractors.get(parser)
+    if extractor is None:
+        extractor = _parse_extractors[parser] = CardExtractor(parser, min_reviews=MIN_RECENSIONI)
+    scarti, tempi, rejected = {}, {}, []
+    # Nessun set di ASIN visti: la deduplica (e il conteggio dei duplicati) spetta allo stadio di scrittura
+    num_results, page_books = extractor.extract(html, cat_name, None, scarti, tempi, rejected)
+    return num_results, page_books, has_next_page(html) if num_results else None, scarti, tempi, rejected
+
+@contextlib.contextmanager
+def _sigint_deferred():
+    """Il Ctrl-C ricevuto dentro il blocco viene rilanciato all'uscita: la pagina si scrive tutta o niente."""
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    ricevuti = []
+    precedente = signal.signal(signal.SIGINT, lambda *_: ricevuti.append(True))
     try:
-        return int(clean)
-    except:
-        return 0
-
-def is_multiple_author(author_text):
-    if not author_text: return True 
-    text = author_text.lower()
-    if ',' in text: return True
-    if ' e ' in text: return True
-    if ' et ' in text or ' and ' in text: return True
+        yield
+    finally:
+        signal.signal(signal.SIGINT, precedente)
+    if ricevuti:
+        raise KeyboardInterrupt
+
+def _put(coda, item, abort):
+    """put bloccante che rinuncia se lo stadio di scrittura è terminato con un errore."""
+    while not abort.is_set():
+        try:
+            coda.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
     return False
 
-def extract_date(text):
-    if not text: return ""
-    match = re.search(r'(\d{1,2}\s+[a-zA-Z]{3}\.?\s+\d{4})', text)
-    if match:
-        return match.group(1)
-    return ""
-
-def append_to_csv(data_list, filename):
-    """Salva i dati della singola pagina accodandoli al CSV esistente."""
-    if not data_list: return
-    df = pd.DataFrame(data_list)
-    
-    # Se il file non esiste, aggiunge l'header; altrimenti accoda solo i dati
-    file_exists = os.path.isfile(filename)
-    df.to_csv(filename, mode='a', header=not file_exists, index=False, encoding='utf-8')
-
-def sort_final_csv(filename):
-    """Alla fine dello scraping, legge il CSV, lo ordina e lo sovrascrive."""
-    if os.path.exists(filename):
-        print(f"\n--- Riordino finale del file CSV: {filename} ---")
-        df = pd.read_csv(filename)
-        df = df.sort_values(by=['Categoria', 'Recensioni'], ascending=[True, False])
-        df.to_csv(filename, index=False, encoding='utf-8')
-        print(f"✅ File CSV ordinato e completato correttamente: {len(df)} righe totali.")
-
-def get_amazon_data(driver, filename):
-    visti_asin = set()
+def _get(coda):
+    # Attese brevi: il Ctrl-C arriva al thread principale anche su Windows
+    while True:
+        try:
+            return coda.get(timeout=0.5)
+        except queue.Empty:
+            continue
+
+def _wait_result(async_result):
+    while not async_result.ready():
+        async_result.wait(0.5)
+    return async_result.get()
+
+def _fetch_stage(fetcher, categorie, output, pool, parser, coda, snapshots, stop_event, abort, finite, errori):
+    """Thread di fetch: scarica le pagine in ordine e le passa al pool senza aspettare il parsing."""
+    try:
+        for cat in categorie:
+            if stop_event.is_set(): break
+            pages = output.pending_pages(cat['name'], range(1, NUM_PAGINE_PER_CATEGORIA + 1))
+            pagine = fetcher.fetch_many([page_url(cat, page) for page in pages])
+            try:
+                for page, (url, html) in zip(pages, pagine):
+                    # Categoria chiusa dallo stop anticipato: le pagine successive non servono
+                    if cat['name'] in finite: break
+                    tempi = {}
+                    if snapshots is not None:
+                        t0 = time.perf_counter()
+                        snapshots.put(cat['name'], page, html)
+                        tempi['snapshot'] = time.perf_counter() - t0
+                    async_result = pool.apply_async(_parse_page, (html, cat['name'], parser))
+                    if not _put(coda, (cat, page, url, async_result, tempi), abort): return
+                    # Ctrl-C: la pagina appena scaricata è in coda, le successive non si scaricano
+                    if stop_event.is_set(): break
+            finally:
+                pagine.close()
+    except Exception as e:
+        # L'errore viene rilanciato dallo stadio di scrittura dopo aver salvato le pagine già scaricate
+        errori.append(e)
+    finally:
+        _put(coda, _FINE, abort)
+
+def crawl_pipeline(fetcher, categorie, output, parser=None, processes=2, queue_pages=PIPELINE_QUEUE_PAGES,
+                   snapshots=None, stats=None, metrics=None):
+    """Crawl delle categorie con fetch, parsing e scrittura sovrapposti (vedi sopra)."""
+    coda = queue.Queue(maxsize=queue_pages)
+    stop_event = threading.Event()   # niente più fetch (Ctrl-C)
+    abort = threading.Event()        # lo stadio di scrittura non legge più la coda
+    finite = set()
+    errori = []
+    pagine_senza_nuovi = {}
+    scritte = set()    # (categoria, pagina) già scritte: una pagina ripresa dopo il Ctrl-C non si riscrive
+    inizio = [time.monotonic()]
+
+    def elabora(voce):
+        cat, page, url, async_result, tempi = voce
+        # Pagine scaricate prima che il fetch vedesse lo stop della categoria: scartate come nel crawl seriale
+        if cat['name'] in finite or (cat['name'], page) in scritte: return
+        if cat['name'] not in pagine_senza_nuovi:
+            print(f"\n\n{'='*20} SCANSIONE: {cat['name'].upper()} {'='*20}")
+        print(f"\n{cat['name']} - Pagina {page}/{NUM_PAGINE_PER_CATEGORIA}...")
+        # Il Ctrl-C può arrivare durante l'attesa del parsing (nulla ancora scritto) ma non durante
+        # la scrittura: da qui in poi la pagina si completa, metriche e stop anticipato compresi
+        num_results, page_books, has_next, scarti, tempi_parsing, rejected = _wait_result(async_result)
+        with _sigint_deferred():
+            tempi = {**tempi, **tempi_parsing}
+            t0 = time.perf_counter()
+            count_ok, mai_visti = _write_page(output, cat, page, num_results, page_books, scarti, rejected)
+            tempi['scrittura'] = time.perf_counter() - t0
+
+            if metrics is not None:
+                metrics.record_page(cat['name'], page, url, num_results, scarti, count_ok, tempi)
+            if stats is not None:
+                stats.record_page(cat['name'], page, time.monotonic() - inizio[0], count_ok)
+            inizio[0] = time.monotonic()
 
+            n = pagine_senza_nuovi.get(cat['name'], 0) + 1 if mai_visti == 0 else 0
+            pagine_senza_nuovi[cat['name']] = n
+            reason = _stop_reason(page, num_results, has_next, n)
+            if reason:
+                finite.add(cat['name'])
+                _stop_category(output, stats, cat, page, reason)
+            scritte.add((cat['name'], page))
+
+    # Il pool nasce prima del thread di fetch (fork senza altri thread attivi)
+    pool = Pool(processes=processes, initializer=_init_parse_worker)
+    fetch_thread = threading.Thread(target=_fetch_stage, daemon=True,
+                                    args=(fetcher, categorie, output, pool, parser, coda, snapshots,
+                                          stop_event, abort, finite, errori))
+    voce = None
+    try:
+        fetch_thread.start()
+        try:
+            while (voce := _get(coda)) is not _FINE:
+                elabora(voce)
+                voce = None
+        except KeyboardInterrupt:
+            print(f"\n⚠️ Interruzione: stop dei download, salvo le pagine già scaricate ({coda.qsize()} in coda)...")
+            stop_event.set()
+            # La pagina in corso al momento del Ctrl-C (saltata se già scritta) e poi il resto della coda
+            if voce is not None and voce is not _FINE:
+                elabora(voce)
+            while (voce := _get(coda)) is not _FINE:
+                elabora(voce)
+            raise
+        if errori:
+            raise errori[0]
+    finally:
+        stop_event.set()
+        abort.set()
+        fetch_thread.join(timeout=30)
+        pool.terminate()
+        pool.join()
+        output.flush()
+
+def get_amazon_data(fetcher, store, snapshots=None, parser=None, journal=None, stats=None, batch_pages=1,
+                    history=None, covers=None, metrics=None, parse_processes=0, queue_pages=PIPELINE_QUEUE_PAGES):
+    """Crawl di tutte le categorie. Con parse_processes > 0 fetch, parsing e scrittura vanno a pipeline."""
+    output = CrawlOutput(store, journal, batch_pages, history, covers)
+    extractor = CardExtractor(parser, min_reviews=MIN_RECENSIONI)
+    categorie = []
     for cat in CATEGORIES:
-        print(f"\n\n{'='*20} SCANSIONE: {cat['name'].upper()} {'='*20}")
-        
-        for page in range(1, NUM_PAGINE_PER_CATEGORIA + 1):
-            page_books = [] # Accumulatore per la singola pagina
-            
-            if page == 1:
-                url = cat['start']
-            else:
-                url = cat['template'].format(page=page)
+        if output.is_category_done(cat['name']):
+            print(f"\n{cat['name']}: già completata in un run precedente, salto.")
+        else:
+            categorie.append(cat)
 
-            print(f"\n{cat['name']} - Pagina {page}/{NUM_PAGINE_PER_CATEGORIA}...")
-            driver.get(url)
-            
-            time.sleep(random.uniform(2.0, 4.0))
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight/2);")
-            time.sleep(1)
-            
-            soup = BeautifulSoup(driver.page_source, 'html.parser')
-            if check_captcha(driver, soup):
-                soup = BeautifulSoup(driver.page_source, 'html.parser')
+    try:
+        if parse_processes:
+            crawl_pipeline(fetcher, categorie, output, parser, parse_processes, queue_pages, snapshots, stats, metrics)
+            return
+        for cat in categorie:
+            print(f"\n\n{'='*20} SCANSIONE: {cat['name'].upper()} {'='*20}")
+            crawl_pages(fetcher, cat, range(1, NUM_PAGINE_PER_CATEGORIA + 1), extractor, output, snapshots,
+                        stats=stats, metrics=metrics)
+    finally:
+        # Anche su Ctrl-C o errore: le pagine ancora nel buffer finiscono su disco
+        output.flush()
 
-            results = soup.find_all('div', {'data-component-type': 's-search-result'})
-            
-            if not results:
-                print("❌ Nessun risultato trovato in questa pagina.")
-                if page > 5: 
-                    print("Probabile fine catalogo per questa categoria.")
-                    break
-                continue
-                
-            print(f"  -> {len(results)} elementi trovati. Elaborazione...")
+# --- CRAWL PARALLELO ---
+def build_crawl_tasks(pages_per_task=None):
+    """Divide categorie e pagine in blocchi (categoria, prima, ultima) da distribuire ai worker."""
+    step = pages_per_task or NUM_PAGINE_PER_CATEGORIA
+    tasks = queue.Queue()
+    for cat in CATEGORIES:
+        for first in range(1, NUM_PAGINE_PER_CATEGORIA + 1, step):
+            tasks.put((cat, first, min(first + step - 1, NUM_PAGINE_PER_CATEGORIA)))
+    return tasks
+
+def crawl_parallel(store, num_workers, pages_per_task=None, snapshots=None, parser=None,
+                   fetch_mode="http", concurrency=1, base_url=None, journal=None, pacer=None, stats=None,
+                   batch_pages=1, history=None, covers=None, metrics=None, browser_profile="lean"):
+    """Fa girare num_workers fetcher (ognuno col suo browser) che si contendono i blocchi di pagine."""
+    tasks = build_crawl_tasks(pages_per_task)
+    output = CrawlOutput(store, journal, batch_pages, history, covers)
+    stop_event = threading.Event()
 
-            count_ok = 0
-            for card in results:
+    # Un solo pacer per tutti i worker: il ritmo delle richieste è globale, non per browser
+    pacer = pacer or AdaptivePacer()
+    fetchers = [make_fetcher(fetch_mode, concurrency, base_url, pacer, metrics, browser_profile)
+                for _ in range(num_workers)]
+
+    errori = []
+
+    def worker(fetcher):
+        extractor = CardExtractor(parser, min_reviews=MIN_RECENSIONI)
+        try:
+            while not stop_event.is_set():
                 try:
-                    asin = card.get('data-asin')
-                    if not asin or asin in visti_asin: continue
-                    
-                    title_tag = card.find('h2')
-                    title = title_tag.get_text(strip=True) if title_tag else "N/D"
-                    
-                    author = "N/D"
-                    author_rows = card.find_all('div', class_='a-row')
-                    for row in author_rows:
-                        row_text = row.get_text(" ", strip=True)
-                        if re.match(r'^di\s+', row_text, re.IGNORECASE):
-                            raw_auth = re.sub(r'^di\s+', '', row_text, flags=re.IGNORECASE)
-                            raw_auth = raw_auth.split('|')[0].split('(')[0]
-                            author = raw_auth.strip()
-                            break
-                    
-                    if author == "N/D": continue
-                    if is_multiple_author(author): continue
-
-                    full_card_text = card.get_text(" ", strip=True)
-                    date_found = extract_date(full_card_text)
-
-                    reviews_count = 0
-                    review_tag = card.find(lambda tag: tag.name == 'a' and tag.has_attr('aria-label') and ('valutazioni' in tag['aria-label'] or 'voti' in tag['aria-label']))
-                    
-                    if review_tag:
-                        label_text = review_tag['aria-label']
-                        reviews_count = clean_reviews_count(label_text.split()[0])
-                    else:
-                        review_span = card.find('span', class_='s-underline-text')
-                        if review_span:
-                            reviews_count = clean_reviews_count(review_span.get_text())
-
-                    if reviews_count < MIN_RECENSIONI: continue
-
-                    img_tag = card.find('img', class_='s-image')
-                    img_url = img_tag['src'] if img_tag else ""
-
-                    visti_asin.add(asin)
-                    page_books.append({
-                        'ASIN': asin,
-                        'Copertina': img_url,
-                        'Titolo': title,
-                        'Autore': author,
-                        'Data': date_found,
-                        'Recensioni': reviews_count,
-                        'Categoria': cat['name'] 
-                    })
-                    count_ok += 1
-
-                except Exception:
-                    continue
-            
-            # Salva i libri trovati in questa pagina direttamente nel CSV
-            append_to_csv(page_books, filename)
-            print(f"  -> {count_ok} nuovi libri aggiunti e salvati nel CSV.")
+                    cat, first, last = tasks.get_nowait()
+                except queue.Empty:
+                    return
+                # Blocchi già completati o tutti oltre la fine del catalogo (anche trovata da un altro worker):
+                # si saltano, mentre quelli prima dello stop vengono finiti
+                if not output.pending_pages(cat['name'], range(first, last + 1)): continue
+                print(f"\n{'='*10} {cat['name'].upper()}: pagine {first}-{last} {'='*10}")
+                crawl_pages(fetcher, cat, range(first, last + 1), extractor, output, snapshots, stop_event, stats,
+                            metrics)
+        except Exception as e:
+            # Un worker caduto lascerebbe blocchi non fatti: si fermano tutti e l'errore arriva a main,
+            # che non finalizza l'output e indica di riprendere con --resume
+            errori.append(e)
+            stop_event.set()
+
+    threads = [threading.Thread(target=worker, args=(f,), daemon=True) for f in fetchers]
+    try:
+        for t in threads: t.start()
+        # join con timeout così il Ctrl-C arriva al thread principale
+        while any(t.is_alive() for t in threads):
+            for t in threads: t.join(timeout=0.5)
+        if errori:
+            raise errori[0]
+    except KeyboardInterrupt:
+        stop_event.set()
+        raise
+    finally:
+        for t in threads: t.join(timeout=30)
+        for f in fetchers: f.close()
+        output.flush()
+
+# --- CRAWL DISTRIBUITO SU CODA SQLITE ---
+# enqueue carica nella coda tutti i lavori (categoria, pagina); ogni worker (processo, anche su
+# un'altra macchina che vede lo stesso file) prende un lavoro alla volta in lease, lo scarica e
+# lo chiude salvando i libri. Il ritmo delle richieste è unico per tutta la coda (SharedPacer).
+# I worker normali usano solo HTTP: una pagina con captcha va nella lista dei captcha invece di
+# fermare il crawl su input(). Con --interactive il worker usa anche il browser e i captcha si
+# risolvono a mano: serve per rigiocare la lista dopo `python crawl_queue.py requeue captcha`.
+
+def enqueue_crawl(queue_path, resume=False, max_rate=None):
+    coda = CrawlQueue(queue_path)
+    if not resume:
+        coda.reset()
+    aggiunti = coda.enqueue([(cat['name'], page, ordine) for ordine, cat in enumerate(CATEGORIES)
+                             for page in range(1, NUM_PAGINE_PER_CATEGORIA + 1)])
+    if max_rate:
+        coda.set_rate(60 / max_rate)
+    print(f"--- {aggiunti} lavori aggiunti a {queue_path} ---")
+    coda.report()
+    coda.close()
+
+def _queue_page(coda, job, fetcher, extractor, cat, interactive=False):
+    """Scarica ed elabora la pagina del lavoro, poi chiude il lavoro nello stato giusto."""
+    url = page_url(cat, job.pagina)
+    try:
+        # Worker senza operatore: una sola richiesta HTTP; in modalità interattiva anche il browser
+        status_code, html = (200, fetcher.fetch(url)) if interactive else fetcher.get(url)
+    except (KeyboardInterrupt, SystemExit):
+        raise
+    except Exception as e:
+        stato = coda.fail(job, f"{e.__class__.__name__}: {e}")
+        if stato is None: return _lease_lost(job)
+        print(f"❌ {job.categoria} p.{job.pagina}: errore di fetch ({e.__class__.__name__}), {stato}.")
+        return
+
+    if is_captcha_page(html):
+        if not coda.dead_letter(job): return _lease_lost(job)
+        print(f"⚠️  {job.categoria} p.{job.pagina}: captcha, messa nella lista dei captcha.")
+        return
+    if status_code != 200:
+        # Rete o server (429/503): errore temporaneo, si riprova e non dice nulla sulla fine del catalogo
+        stato = coda.fail(job, f"HTTP {status_code}" if status_code is not None else "errore di rete")
+        if stato is None: return _lease_lost(job)
+        print(f"❌ {job.categoria} p.{job.pagina}: risposta {status_code or 'assente'}, {stato}.")
+        return
+
+    num_results, page_books = extractor.extract(html, job.categoria)
+    if not num_results:
+        # Errore del server o fine del catalogo: si riprova, e se resta vuota si chiude la categoria
+        stato = coda.fail(job, "nessun risultato")
+        if stato is None: return _lease_lost(job)
+        print(f"❌ {job.categoria} p.{job.pagina}: nessun risultato trovato ({stato}).")
+        if stato == "fallito" and job.pagina > 5:
+            _skip_rest(coda, job, "pagina vuota, probabile fine catalogo")
+        return
+
+    for book in page_books:
+        book['Posizione'] += (job.pagina - 1) * num_results
+    nuovi = coda.complete(job, page_books)
+    if nuovi is None: return _lease_lost(job)
+    print(f"  -> {job.categoria} p.{job.pagina}: {num_results} elementi, {nuovi} nuovi libri salvati.")
+    if has_next_page(html) is False:
+        _skip_rest(coda, job, "nessuna pagina successiva")
+
+def _lease_lost(job):
+    # Il lease è scaduto e il lavoro è già passato a un altro worker: lo chiude lui
+    print(f"⚠️  {job.categoria} p.{job.pagina}: lease scaduto, risultato scartato.")
+
+def _skip_rest(coda, job, reason):
+    saltate = coda.skip_after(job.categoria, job.pagina, reason)
+    print(f"⏹️  {job.categoria}: stop a pagina {job.pagina} ({reason}), {saltate} pagine saltate.")
+
+def queue_worker(queue_path, fetch_mode="http", base_url=None, parser=None, browser_profile="lean",
+                 interactive=False, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+    """Consuma la coda finché ci sono lavori da fare o in corso presso altri worker."""
+    worker = f"{socket.gethostname()}-{os.getpid()}"
+    coda = CrawlQueue(queue_path, lease_seconds, max_attempts)
+    pacer = SharedPacer(queue_path)
+    if interactive:
+        fetcher = make_fetcher(fetch_mode, 1, base_url, pacer, browser_profile=browser_profile)
+    else:
+        # Nessun ripiego sul browser: i captcha non devono bloccare un worker senza operatore
+        fetcher = HttpFetcher(pacer=pacer, base_url=base_url)
+    extractor = CardExtractor(parser, min_reviews=MIN_RECENSIONI)
+    by_name = {cat['name']: cat for cat in CATEGORIES}
+    job = None
+    try:
+        while True:
+            job = coda.lease(worker)
+            if job is None:
+                # Nulla di libero: lavori in corso altrove o in attesa di un nuovo tentativo
+                if not coda.remaining(): break
+                time.sleep(2)
+                continue
+            _queue_page(coda, job, fetcher, extractor, by_name[job.categoria], interactive)
+            job = None
+    except KeyboardInterrupt:
+        # Il lavoro in corso torna subito in coda invece di aspettare la scadenza del lease
+        if job is not None:
+            coda.release(job)
+    finally:
+        fetcher.close()
+        pacer.close()
+        coda.close()
+
+def run_queue_workers(queue_path, num_workers, **kwargs):
+    """Avvia num_workers processi worker su questa macchina e attende che la coda sia vuota."""
+    if num_workers <= 1:
+        queue_worker(queue_path, **kwargs)
+        return
+    processi = [Process(target=queue_worker, args=(queue_path,), kwargs=kwargs) for _ in range(num_workers)]
+    for p in processi: p.start()
+    try:
+        for p in processi: p.join()
+    except KeyboardInterrupt:
+        # Il Ctrl-C arriva anche ai worker, che restituiscono il lavoro in corso ed escono
+        for p in processi: p.join()
+        raise
+
+# --- REPLAY OFFLINE DEGLI SNAPSHOT ---
+def _replay_page(task):
+    """Eseguita nei processi del pool: legge uno snapshot ed estrae i libri candidati."""
+    root, cat_name, page, digest, parser = task
+    extractor = CardExtractor(parser, min_reviews=MIN_RECENSIONI)
+    # Set locale alla pagina: la deduplica tra pagine avviene poi, in ordine, nel processo principale
+    return extractor.extract(read_snapshot(root, digest), cat_name)
+
+def replay_snapshots(snapshot_dir, store, processes=None, parser=None, covers=None):
+    """Ricostruisce l'archivio dagli snapshot salvati, senza browser, usando tutti i core."""
+    entries = SnapshotStore(snapshot_dir).entries()
+    if not entries:
+        print(f"❌ Nessuno snapshot trovato in {snapshot_dir}.")
+        return
+
+    # Stesso ordine del crawl (categorie come in CATEGORIES, poi pagina) così la deduplica dà lo stesso risultato
+    cat_order = {cat['name']: i for i, cat in enumerate(CATEGORIES)}
+    keys = sorted(entries, key=lambda k: (cat_order.get(k[0], len(cat_order)), k[0], k[1]))
+    tasks = [(snapshot_dir, cat_name, page, entries[(cat_name, page)], parser) for cat_name, page in keys]
+
+    print(f"--- Replay di {len(tasks)} pagine da {snapshot_dir} ---")
+    store = CsvStore(store) if isinstance(store, str) else store
+    store.reset()
+
+    # Nessun giornale da tenere allineato: si può scrivere a blocchi grandi
+    output = CrawlOutput(store, batch_pages=50, covers=covers)
+    totale = 0
+    with Pool(processes=processes) as pool:
+        for _, candidati in pool.imap(_replay_page, tasks, chunksize=8):
+            totale += output.save_page(candidati)
+
+    output.flush()
+    print(f"✅ Replay completato: {totale} libri estratti.")
+    store.finalize()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Scraper dei libri più recensiti su Amazon.it")
+    parser.add_argument("mode", nargs="?", choices=["crawl", "replay", "enqueue", "worker"], default="crawl",
+                        help="crawl: scarica da Amazon (default); replay: ricostruisce il CSV dagli snapshot; "
+                             "enqueue: carica categorie e pagine nella coda di lavoro; worker: consuma la coda")
+    parser.add_argument("--output", default=None,
+                        help=f"File di destinazione (default: {OUTPUT_FILE} o {SQLITE_FILE} con --store sqlite)")
+    parser.add_argument("--store", choices=STORE_BACKENDS, default="csv",
+                        help="csv: CSV riordinato a fine crawl (default); sqlite: archivio indicizzato, senza riordino")
+    parser.add_argument("--export-csv", default=None,
+                        help=f"Con --store sqlite (o in modalità worker) esporta anche il CSV ordinato a fine crawl (es. {OUTPUT_FILE} per l'app)")
+    parser.add_argument("--batch-pages", type=int, default=None,
+                        help="Pagine raggruppate in ogni scrittura (default: 1 per csv, 10 per sqlite)")
+    parser.add_argument("--capture", action="store_true",
+                        help="Durante il crawl salva l'HTML di ogni pagina nell'archivio snapshot")
+    parser.add_argument("--snapshots", default=DEFAULT_SNAPSHOT_DIR, help="Cartella dell'archivio snapshot")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="Processi per il replay (default: tutti i core)")
+    parser.add_argument("--parser", choices=sorted(BACKENDS), default=DEFAULT_BACKEND,
+                        help=f"Backend di estrazione delle card (default: {DEFAULT_BACKEND})")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Browser da usare in parallelo durante il crawl, o processi worker sulla coda (default: 1)")
+    parser.add_argument("--queue", default=QUEUE_FILE, help=f"File SQLite della coda di lavoro (default: {QUEUE_FILE})")
+    parser.add_argument("--max-rate", type=float, default=None,
+                        help="enqueue: massimo di pagine al minuto per tutti i worker della coda insieme")
+    parser.add_argument("--lease-seconds", type=float, default=LEASE_SECONDS,
+                        help=f"Secondi dopo i quali un lavoro di un worker fermo torna in coda (default: {LEASE_SECONDS})")
+    parser.add_argument("--max-attempts", type=int, default=MAX_ATTEMPTS,
+                        help=f"Tentativi per pagina prima di segnarla come fallita (default: {MAX_ATTEMPTS})")
+    parser.add_argument("--interactive", action="store_true",
+                        help="worker: usa anche il browser e chiede di risolvere i captcha (per rigiocare la lista dei captcha)")
+    parser.add_argument("--pages-per-task", type=int, default=None,
+                        help="Pagine per blocco di lavoro nel crawl parallelo (default: categoria intera)")
+    parser.add_argument("--fetch", choices=["http", "browser"], default="http",
+                        help="http: richieste HTTP con ripiego sul browser (default); browser: solo Selenium")
+    parser.add_argument("--browser-profile", choices=BROWSER_PROFILES, default="lean",
+                        help="lean: headless senza immagini/font, captcha in una finestra visibile (default); "
+                             "classic: browser visibile completo")
+    parser.add_argument("--parse-processes", type=int, default=2,
+                        help="Processi che estraggono le card mentre il browser scarica le pagine successive "
+                             "(default: 2; 0 = fetch, parsing e scrittura in sequenza). Solo con --workers 1")
+    parser.add_argument("--queue-pages", type=int, default=PIPELINE_QUEUE_PAGES,
+                        help=f"Pagine scaricate in attesa di parsing e scrittura (default: {PIPELINE_QUEUE_PAGES})")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Richieste HTTP in volo per ogni worker (default: 1)")
+    parser.add_argument("--base-url", default=None,
+                        help="Sostituisce l'host di Amazon (es. server stub locale con le pagine registrate)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Riprende il crawl interrotto dal giornale invece di ripartire da zero")
+    parser.add_argument("--incremental", action="store_true",
+                        help=f"Aggiorna l'archivio esistente riscrivendo solo le righe cambiate e tiene lo storico in {HISTORY_FILE}")
+    parser.add_argument("--covers", action="store_true",
+                        help="Scarica le copertine dei libri nella cache locale usata dall'app")
+    parser.add_argument("--covers-dir", default=COVER_CACHE_DIR, help="Cartella della cache delle copertine")
+    parser.add_argument("--covers-max-mb", type=float, default=DEFAULT_MAX_MB,
+                        help=f"Spazio massimo della cache copertine in MB (default: {DEFAULT_MAX_MB})")
+    parser.add_argument("--metrics", default=None,
+                        help="File JSON-lines con tempi per fase e contatori di ogni pagina (default: <output>.metrics.jsonl)")
+    args = parser.parse_args(argv)
+    if args.output is None:
+        args.output = SQLITE_FILE if args.store == "sqlite" else OUTPUT_FILE
+    if args.metrics is None:
+        args.metrics = metrics_path_for(args.output)
+    if args.batch_pages is None:
+        args.batch_pages = 10 if args.store == "sqlite" else 1
+    return args
+
+def open_covers(args):
+    if not args.covers: return None
+    return CoverPrefetcher(CoverCache(args.covers_dir, args.covers_max_mb))
+
+def close_covers(covers):
+    """Attende i download in corso e stampa il riepilogo della cache."""
+    if covers is None: return
+    if covers.pending():
+        print(f"--- Attendo il download di {covers.pending()} copertine ---")
+    covers.close()
+    s = covers.cache.stats
+    print(f"🖼️ Copertine: {s['scaricate']} scaricate, {s['duplicate']} duplicate, "
+          f"{s['errori']} non valide, {s['eliminate']} eliminate dalla cache")
+    covers.cache.close()
+
+def close_metrics(metrics):
+    metrics.report()
+    metrics.close()
+    print(f"Metriche per pagina salvate in {metrics.path}")
+
+def close_history(history):
+    if history is not None:
+        history.report()
+        history.close()
+
+def finalize_output(store, export_csv=None):
+    """Chiusura del crawl: riordino del CSV (solo backend csv) ed eventuale esportazione."""
+    store.finalize()
+    if export_csv:
+        store.export_csv(export_csv)
 
 def main():
-    # Rimuove il file precedente per evitare di mischiare i dati se fai ripartire da zero
-    if os.path.exists(OUTPUT_FILE):
-        os.remove(OUTPUT_FILE)
-        
-    driver = setup_driver()
+    args = parse_args()
+
+    if args.mode == "enqueue":
+        enqueue_crawl(args.queue, resume=args.resume, max_rate=args.max_rate)
+        return
+    if args.mode == "worker":
+        try:
+            run_queue_workers(args.queue, args.workers, fetch_mode=args.fetch, base_url=args.base_url,
+                              parser=args.parser, browser_profile=args.browser_profile, interactive=args.interactive,
+                              lease_seconds=args.lease_seconds, max_attempts=args.max_attempts)
+        except KeyboardInterrupt:
+            print("\n⚠️ Worker interrotti: i lavori in corso sono tornati in coda.")
+        coda = CrawlQueue(args.queue)
+        coda.report()
+        if args.export_csv:
+            coda.export_csv(args.export_csv)
+        coda.close()
+        return
+
+    store = open_store(args.output, args.store)
+
+    covers = open_covers(args)
+
+    if args.mode == "replay":
+        replay_snapshots(args.snapshots, store, processes=args.processes, parser=args.parser, covers=covers)
+        if args.export_csv:
+            store.export_csv(args.export_csv)
+        close_covers(covers)
+        store.close()
+        return
+
+    journal_file = journal_path_for(args.output)
+    if args.resume:
+        journal = CrawlJournal.load(journal_file)
+        pagine_fatte = sum(len(p) for p in journal.pagine_completate.values())
+        print(f"--- Ripresa del crawl: {pagine_fatte} pagine già completate, {len(journal.visti_asin)} ASIN già visti ---")
+    else:
+        # Rimuove il file precedente per evitare di mischiare i dati se fai ripartire da zero
+        # (in modalità incrementale invece l'archivio si aggiorna)
+        if not args.incremental:
+            store.reset()
+        journal = CrawlJournal(journal_file)
+        journal.reset()
+
+    snapshots = SnapshotStore(args.snapshots) if args.capture else None
+    pacer = AdaptivePacer()
+    stats = CrawlStats(NUM_PAGINE_PER_CATEGORIA)
+    history = ReviewHistory(HISTORY_FILE) if args.incremental else None
+    # In ripresa le metriche si accodano a quelle del run interrotto
+    metrics = CrawlMetrics(args.metrics, append=args.resume)
+
+    if args.workers > 1:
+        try:
+            crawl_parallel(store, args.workers, args.pages_per_task, snapshots=snapshots, parser=args.parser,
+                           fetch_mode=args.fetch, concurrency=args.concurrency, base_url=args.base_url,
+                           journal=journal, pacer=pacer, stats=stats, batch_pages=args.batch_pages,
+                           history=history, covers=covers, metrics=metrics, browser_profile=args.browser_profile)
+            finalize_output(store, args.export_csv)
+        except KeyboardInterrupt:
+            print("\n⚠️ Scraping interrotto manualmente. I dati scaricati finora sono salvi nel CSV.")
+            print("Per continuare da dove eri rimasto: python scraper_amazon.py --resume")
+        except Exception as e:
+            print(f"\n❌ Errore imprevisto: {e}")
+            print("I dati processati fino a questo momento sono al sicuro nel CSV (riprendi con --resume).")
+        finally:
+            stats.report(pacer)
+            close_metrics(metrics)
+            close_history(history)
+            close_covers(covers)
+            store.close()
+        return
+
+    fetcher = make_fetcher(args.fetch, args.concurrency, args.base_url, pacer, metrics, args.browser_profile)
     try:
-        get_amazon_data(driver, OUTPUT_FILE)
-        # Se tutto finisce senza errori, applica l'ordinamento finale
-        sort_final_csv(OUTPUT_FILE)
+        get_amazon_data(fetcher, store, snapshots=snapshots, parser=args.parser, journal=journal, stats=stats,
+                        batch_pages=args.batch_pages, history=history, covers=covers, metrics=metrics,
+                        parse_processes=args.parse_processes, queue_pages=args.queue_pages)
+        # Se tutto finisce senza errori, applica l'ordinamento finale (solo CSV) ed esporta
+        finalize_output(store, args.export_csv)
     except KeyboardInterrupt:
         print("\n⚠️ Scraping interrotto manualmente. I dati scaricati finora sono salvi nel CSV.")
+        print("Per continuare da dove eri rimasto: python scraper_amazon.py --resume")
     except Exception as e:
         print(f"\n❌ Errore imprevisto: {e}")
-        print("I dati processati fino a questo momento sono al sicuro nel CSV.")
+        print("I dati processati fino a questo momento sono al sicuro nel CSV (riprendi con --resume).")
     finally:
-        driver.quit()
+        fetcher.close()
+        stats.report(pacer)
+        close_metrics(metrics)
+        close_history(history)
+        close_covers(covers)
+        store.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,266 @@
+import re
+import sys
+import threading
+import unicodedata
+from array import array
+from collections import defaultdict
+import numpy as np
+
+# --- INDICE DI RICERCA SU TITOLO E AUTORE ---
+# Indice invertito a trigrammi, tenuto in cache con il DataFrame. Ogni parola viene normalizzata
+# (minuscole, senza accenti) e scomposta in trigrammi: una parola della ricerca trova le righe che
+# ne condividono la maggior parte, quindi funzionano anche parole parziali e piccoli errori di
+# battitura. Le righe nuove si aggiungono con add(). Con una sorgente (source) l'indice si
+# costruisce solo alla prima ricerca o al primo raggruppamento: molte sessioni non li usano.
+#
+# Lo stesso indice raggruppa le edizioni dello stesso libro: stesso autore, stesso volume, titoli
+# quasi uguali a meno delle diciture di edizione, e le parole diverse sono solo aggiunte o varianti
+# (refusi, plurali) e non parole diverse ("... JUVENTUS Edition" / "... MILAN Edition").
+# Per ogni riga restano solo le parole del titolo (id del vocabolario): i trigrammi servono solo
+# durante il collegamento e si ricalcolano dalle parole.
+
+SOGLIA_PAROLA = 0.6      # quota di trigrammi di una parola che deve essere presente
+SOGLIA_EDIZIONI = 0.8    # somiglianza (Jaccard sui trigrammi) tra titoli della stessa opera
+
+# Diciture che cambiano tra un'edizione e l'altra senza cambiare il libro
+_TRA_PARENTESI = re.compile(r"\([^)]*\)|\[[^\]]*\]")
+_RUMORE_EDIZIONE = re.compile(
+    r"\b(?:nuova|ediz|edizione|illustrata|integrale|tascabile|economica|"
+    r"copertina|flessibile|rigida|con|espansione|online|ebook|vol|volume|libro)\b"
+)
+# Volume dell'opera, anche tra parentesi (sul testo normalizzato "Vol. A-C" diventa "vol a c"),
+# oppure numero finale del titolo (al più due cifre: un anno indica un'edizione, non un volume)
+_VOLUME = re.compile(r"\b(?:vol|volume|tomo)\s+(\d+|[ivxlc]+|[a-z](?: [a-z])?)\b")
+_NUMERO_FINALE = re.compile(r"(?:^|\s)(\d{1,2}|[ivx]{1,4})$")
+_ACCENTI = re.compile("[\u0300-\u036f]")
+
+
+def normalize(text):
+    """Minuscole, senza accenti e punteggiatura, spazi singoli."""
+    # NFKD separa gli accenti dalle lettere, che poi vengono scartati
+    text = _ACCENTI.sub("", unicodedata.normalize("NFKD", str(text).lower()))
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", text).split())
+
+
+def trigrams(word):
+    """Trigrammi di una parola con un bordo di spazi (le parole corte ne hanno almeno uno)."""
+    padded = f" {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def _same_edition(parole_a, tri_a, parole_b, tri_b):
+    if _jaccard(tri_a, tri_b) < SOGLIA_EDIZIONI: return False
+    solo_a, solo_b = parole_a - parole_b, parole_b - parole_a
+    # Un titolo contiene l'altro (es. sottotitolo aggiunto)
+    if not solo_a or not solo_b: return True
+    return all(any(_jaccard(trigrams(x), trigrams(y)) >= 0.5 for y in solo_b) for x in solo_a)
+
+
+def edition_key(title):
+    """Titolo senza le diciture di edizione, usato per riconoscere le edizioni dello stesso libro."""
+    return " ".join(_RUMORE_EDIZIONE.sub(" ", normalize(_TRA_PARENTESI.sub(" ", str(title)))).split())
+
+
+def edition_volume(title):
+    """Volume o numero dell'opera ("" se non c'è): volumi diversi non sono edizioni dello stesso libro."""
+    volumi = _VOLUME.findall(normalize(title))
+    if volumi:
+        return " ".join(volumi)
+    finale = _NUMERO_FINALE.search(normalize(_TRA_PARENTESI.sub(" ", str(title))))
+    return finale.group(1) if finale else ""
+
+
+class TextSearchIndex:
+    def __init__(self, titles=(), authors=(), source=None):
+        """source: funzione senza argomenti che ritorna (titoli, autori); se c'è, l'indice si costruisce
+        da lì alla prima ricerca o al primo raggruppamento invece che subito."""
+        self._postings = {}                  # trigramma -> np.int32 con gli id delle righe (crescenti)
+        self.size = 0
+        self._lock = threading.Lock()
+
+        # Edizioni: union-find sulle righe. Le righe con stesso autore, prima parola e volume formano
+        # un blocco, una catena di id (ultima riga del blocco -> riga precedente -> ... -> -1)
+        self._vocabolario = {}               # parola -> id
+        self._parole = []                    # id -> parola
+        self._parole_riga = array('i')       # id delle parole di tutte le righe, una dopo l'altra
+        self._inizio_riga = array('q', [0])  # riga -> inizio delle sue parole in _parole_riga
+        # Chiave del blocco come hash di (autore, prima parola, volume): in caso di collisione si fa
+        # solo un confronto in più, che il controllo sui titoli scarta
+        self._ultimo_blocco = {}
+        self._precedente = array('i')
+        self._parent = array('i')
+        self._edizioni = None
+        self._source = source
+        if source is None:
+            self.add(titles, authors)
+
+    def __len__(self):
+        self._build()
+        return self.size
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls(df['Titolo'].tolist(), df['Autore'].tolist())
+
+    @property
+    def built(self):
+        return self._source is None
+
+    def _build(self):
+        """Costruisce l'indice dalla sorgente, una volta sola anche con più sessioni in parallelo."""
+        if self._source is None: return
+        with self._lock:
+            if self._source is None: return
+            self._add(*self._source())
+            self._source = None
+
+    @property
+    def nbytes(self):
+        """Stima della memoria occupata (0 finché l'indice non è costruito)."""
+        if not self.built: return 0
+        # np.ndarray e array.array contano anche i dati che possiedono
+        totale = sys.getsizeof(self._postings)
+        totale += sum(sys.getsizeof(tri) + sys.getsizeof(righe) for tri, righe in self._postings.items())
+        totale += sys.getsizeof(self._vocabolario) + sys.getsizeof(self._parole) + sum(map(sys.getsizeof, self._parole))
+        totale += sum(map(sys.getsizeof, self._vocabolario.values()))
+        # Chiavi e valori del dizionario dei blocchi sono int
+        totale += sys.getsizeof(self._ultimo_blocco) + len(self._ultimo_blocco) * 2 * sys.getsizeof(2 ** 40)
+        for arr in (self._parole_riga, self._inizio_riga, self._precedente, self._parent):
+            totale += sys.getsizeof(arr)
+        return totale
+
+    # --- AGGIORNAMENTO ---
+    def add(self, titles, authors):
+        """Aggiunge righe in coda (id = posizione nel DataFrame) e aggiorna i gruppi di edizioni."""
+        self._build()
+        with self._lock:
+            self._add(titles, authors)
+
+    def _add(self, titles, authors):
+        nuovi = defaultdict(lambda: array('i'))
+        # Trigrammi delle parole del vocabolario usate in questa chiamata: si buttano alla fine
+        tri_parole = {}
+        for title, author in zip(titles, authors):
+            doc = self.size
+            self.size += 1
+            self._parent.append(doc)
+            titolo, autore = normalize(title), normalize(author)
+            for tri in set().union(*map(trigrams, f"{titolo} {autore}".split())):
+                nuovi[tri].append(doc)
+            self._link_editions(doc, edition_key(title), autore, edition_volume(title), tri_parole)
+
+        for tri, righe in nuovi.items():
+            righe = np.array(righe, dtype=np.int32)
+            vecchie = self._postings.get(tri)
+            self._postings[tri] = righe if vecchie is None else np.concatenate((vecchie, righe))
+        self._edizioni = None
+
+    def _word_id(self, parola):
+        indice = self._vocabolario.get(parola)
+        if indice is None:
+            indice = self._vocabolario[parola] = len(self._parole)
+            self._parole.append(parola)
+        return indice
+
+    def _word_sets(self, doc, tri_parole):
+        """(parole, trigrammi) della chiave di edizione di una riga, ricostruiti dal vocabolario."""
+        ids = self._parole_riga[self._inizio_riga[doc]:self._inizio_riga[doc + 1]]
+        tri = set()
+        for i in ids:
+            tri_parola = tri_parole.get(i)
+            if tri_parola is None:
+                tri_parola = tri_parole[i] = frozenset(trigrams(self._parole[i]))
+            tri |= tri_parola
+        return {self._parole[i] for i in ids}, tri
+
+    def _link_editions(self, doc, chiave, autore, volume, tri_parole):
+        parole = chiave.split()
+        self._parole_riga.extend(self._word_id(p) for p in dict.fromkeys(parole))
+        self._inizio_riga.append(len(self._parole_riga))
+        if not parole:
+            self._precedente.append(-1)
+            return
+        blocco = hash((autore, parole[0], volume))
+        altro = self._ultimo_blocco.get(blocco, -1)
+        self._precedente.append(altro)
+        self._ultimo_blocco[blocco] = doc
+        if altro < 0: return
+        # Solo le righe di blocchi con più titoli ricostruiscono parole e trigrammi
+        parole, tri = self._word_sets(doc, tri_parole)
+        while altro >= 0:
+            if _same_edition(parole, tri, *self._word_sets(altro, tri_parole)):
+                self._union(doc, altro)
+            altro = self._precedente[altro]
+
+    def _find(self, doc):
+        while self._parent[doc] != doc:
+            self._parent[doc] = self._parent[self._parent[doc]]
+            doc = self._parent[doc]
+        return doc
+
+    def _union(self, a, b):
+        ra, rb = self._find(a), self._find(b)
+        if ra != rb:
+            # La radice è sempre la riga con l'id più basso
+            self._parent[max(ra, rb)] = min(ra, rb)
+
+    # --- RICERCA ---
+    def _posting(self, tri):
+        return self._postings.get(tri, _VUOTA)
+
+    def search(self, query):
+        """Id delle righe che contengono (anche in modo approssimato) tutte le parole della ricerca.
+
+        Ordinati per pertinenza: trigrammi in comune con la ricerca, dal più alto.
+        """
+        self._build()
+        parole = normalize(query).split()
+        if not parole or not self.size: return np.empty(0, dtype=np.intp)
+        punteggio = np.zeros(self.size, dtype=np.int32)
+        validi = np.ones(self.size, dtype=bool)
+        for parola in parole:
+            tri = trigrams(parola)
+            liste = [self._posting(t) for t in tri]
+            conteggi = np.bincount(np.concatenate(liste), minlength=self.size) if liste else punteggio * 0
+            # Parole corte: basta un trigramma in meno per cambiare parola, si richiedono tutti
+            minimo = len(tri) if len(parola) <= 3 else int(np.ceil(len(tri) * SOGLIA_PAROLA))
+            validi &= conteggi >= minimo
+            punteggio += conteggi
+        righe = np.flatnonzero(validi)
+        return righe[np.argsort(-punteggio[righe], kind='stable')]
+
+    # --- EDIZIONI ---
+    def edition_ids(self):
+        """Per ogni riga l'id del gruppo di edizioni (la prima riga del gruppo)."""
+        self._build()
+        if self._edizioni is None:
+            self._edizioni = np.fromiter((self._find(d) for d in range(self.size)), dtype=np.intp, count=self.size)
+            self._edizioni.flags.writeable = False
+        return self._edizioni
+
+    def edition_groups(self):
+        """Gruppi con più di un'edizione: lista di liste di id."""
+        self._build()
+        gruppi = defaultdict(list)
+        for doc in range(self.size):
+            gruppi[self._find(doc)].append(doc)
+        return [g for g in gruppi.values() if len(g) > 1]
+
+
+_VUOTA = np.empty(0, dtype=np.int32)
+
+
+def collapse_editions(positions, edition_ids):
+    """Tiene solo la prima riga (nell'ordine dato) di ogni gruppo di edizioni."""
+    if len(positions) == 0: return positions
+    _, primi = np.unique(edition_ids[positions], return_index=True)
+    return positions[np.sort(primi)]
+
+
+def filter_positions(positions, hits):
+    """Restringe le posizioni ai risultati della ricerca mantenendo l'ordinamento scelto."""
+    return positions[np.isin(positions, hits)]
@@ -0,0 +1,73 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import threading
+
+# --- ARCHIVIO SNAPSHOT HTML ---
+# Ogni pagina viene salvata compressa e indirizzata per contenuto (sha256):
+#   <root>/objects/ab/abcdef....html.gz
+# L'indice (index.jsonl) collega ogni coppia (categoria, pagina) al suo hash.
+# Le righe successive per la stessa coppia sostituiscono le precedenti.
+
+DEFAULT_SNAPSHOT_DIR = "snapshots"
+
+
+class SnapshotStore:
+    def __init__(self, root=DEFAULT_SNAPSHOT_DIR):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.index_file = os.path.join(root, "index.jsonl")
+        self._lock = threading.Lock()
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], f"{digest}.html.gz")
+
+    def put(self, category, page, html):
+        """Salva l'HTML di una pagina e lo registra nell'indice. Ritorna l'hash."""
+        data = html.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.object_path(digest)
+
+        # Contenuto già presente: basta aggiornare l'indice
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with gzip.open(tmp_path, "wb", compresslevel=6) as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+        record = {"categoria": category, "pagina": page, "sha256": digest, "ts": time.time()}
+        with self._lock:
+            with open(self.index_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return digest
+
+    def get(self, digest):
+        return read_snapshot(self.root, digest)
+
+    def entries(self):
+        """Ritorna {(categoria, pagina): sha256} con l'ultimo snapshot per ogni pagina."""
+        latest = {}
+        if not os.path.exists(self.index_file):
+            return latest
+        with open(self.index_file, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line: continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Riga troncata da un'interruzione durante la scrittura
+                    continue
+                latest[(record["categoria"], int(record["pagina"]))] = record["sha256"]
+        return latest
+
+
+def read_snapshot(root, digest):
+    """Legge uno snapshot senza istanziare lo store (usata dai processi di replay)."""
+    path = os.path.join(root, "objects", digest[:2], f"{digest}.html.gz")
+    with gzip.open(path, "rb") as f:
+        return f.read().decode("utf-8")
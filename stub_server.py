@@ -0,0 +1,103 @@
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit
+
+from snapshot_store import SnapshotStore, DEFAULT_SNAPSHOT_DIR
+
+# --- SERVER STUB LOCALE ---
+# Restituisce pagine registrate (es. dall'archivio snapshot) al posto di Amazon, così il
+# fetcher HTTP e il ripiego sul browser si possono provare offline:
+#   python stub_server.py --snapshots snapshots --port 8000
+#   python scraper_amazon.py --base-url http://127.0.0.1:8000
+
+
+def url_key(url):
+    """Chiave di routing: percorso + query string, senza schema e host."""
+    parts = urlsplit(url)
+    return f"{parts.path}?{parts.query}" if parts.query else parts.path
+
+
+class StubServer:
+    def __init__(self, pages=None, host="127.0.0.1", port=0):
+        """pages: {url o percorso?query: html oppure (status, html)}."""
+        self.pages = {url_key(k): v for k, v in (pages or {}).items()}
+        self.requests = []  # percorsi richiesti, in ordine, per le verifiche
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._thread = None
+
+    @classmethod
+    def from_snapshots(cls, store, categories, **kwargs):
+        """Pubblica ogni snapshot all'URL che aveva nel crawl (start per pagina 1, template per le altre)."""
+        by_name = {cat['name']: cat for cat in categories}
+        pages = {}
+        for (cat_name, page), digest in store.entries().items():
+            cat = by_name.get(cat_name)
+            if cat is None: continue
+            url = cat['start'] if page == 1 else cat['template'].format(page=page)
+            pages[url] = store.get(digest)
+        return cls(pages, **kwargs)
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, come il server reale
+
+            def do_GET(self):
+                stub.requests.append(self.path)
+                page = stub.pages.get(url_key(self.path))
+                if page is None:
+                    status, body = 404, "<html><body>Pagina non registrata</body></html>"
+                elif isinstance(page, tuple):
+                    status, body = page
+                else:
+                    status, body = 200, page
+                data = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    from scraper_amazon import CATEGORIES
+
+    parser = argparse.ArgumentParser(description="Serve le pagine registrate come se fossero Amazon")
+    parser.add_argument("--snapshots", default=DEFAULT_SNAPSHOT_DIR)
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    stub = StubServer.from_snapshots(SnapshotStore(args.snapshots), CATEGORIES, port=args.port)
+    print(f"Stub in ascolto su {stub.base_url} con {len(stub.pages)} pagine (Ctrl-C per uscire)")
+    try:
+        stub._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,35 @@
+from search_index import TextSearchIndex, edition_volume
+
+# Volumi diversi della stessa opera non sono edizioni dello stesso libro (titoli dal CSV dello scraper)
+
+
+def test_edition_volume():
+    assert edition_volume("Analisi matematica (Vol. 1)") == "1"
+    assert edition_volume("La città delle note. Musica dalle origini a oggi (Vol. A-C)") == "a c"
+    assert edition_volume("Storia di Roma vol. II") == "ii"
+    assert edition_volume("Harry Potter 2") == "2"
+    assert edition_volume("Guida ai ristoranti 2024") == ""
+    assert edition_volume("Il nome della rosa") == ""
+
+
+def test_volumes_are_not_grouped():
+    titoli = [
+        "Analisi matematica (Vol. 1)",
+        "Analisi matematica (Vol. 2)",
+        "Analisi matematica. Vol. 1",
+    ]
+    indice = TextSearchIndex(titoli, ["Enrico Giusti"] * 3)
+    assert indice.edition_groups() == [[0, 2]]
+
+
+def test_lazy_source():
+    chiamate = []
+
+    def source():
+        chiamate.append(1)
+        return ["Analisi matematica (Vol. 1)", "Analisi matematica (Vol. 2)"], ["Enrico Giusti"] * 2
+
+    indice = TextSearchIndex(source=source)
+    assert not chiamate and indice.nbytes == 0
+    assert list(indice.search("analisi")) == [0, 1]
+    assert len(indice.edition_ids()) == 2 and chiamate == [1]
@@ -0,0 +1,261 @@
+import time
+import atexit
+import sqlite3
+import threading
+
+# --- WISHLIST CON SINCRONIZZAZIONE IN SCRITTURA DIFFERITA ---
+# Lo stato locale (condiviso da tutte le sessioni dell'app) cambia subito a ogni click;
+# un thread in background invia inserimenti e cancellazioni al backend a blocchi, con retry.
+# Il backend è intercambiabile: Supabase in produzione, SQLite per i test e l'uso offline.
+
+LOCAL_WISHLIST_FILE = "wishlist_locale.sqlite"
+
+
+class SupabaseWishlistBackend:
+    name = "supabase"
+
+    def __init__(self, client, table="wishlist"):
+        self.client = client
+        self.table = table
+
+    def load_all(self):
+        risposta = self.client.table(self.table).select("asin").execute()
+        return set(r["asin"] for r in risposta.data)
+
+    def add_many(self, asins):
+        self.client.table(self.table).insert([{"asin": a} for a in asins]).execute()
+
+    def remove_many(self, asins):
+        self.client.table(self.table).delete().in_("asin", list(asins)).execute()
+
+    def clear(self):
+        self.client.table(self.table).delete().neq("asin", "dummy_value").execute()
+
+    def changes_since(self, cursor):
+        """La tabella non ha un registro delle modifiche: si confronta l'elenco degli ASIN (una sola colonna)."""
+        return None, self.load_all()
+
+
+class SqliteWishlistBackend:
+    name = "sqlite"
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS wishlist (asin TEXT PRIMARY KEY) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS wishlist_modifiche (
+            seq  INTEGER PRIMARY KEY AUTOINCREMENT,
+            asin TEXT NOT NULL,
+            op   TEXT NOT NULL
+        );
+        CREATE TRIGGER IF NOT EXISTS wishlist_ins AFTER INSERT ON wishlist
+            BEGIN INSERT INTO wishlist_modifiche (asin, op) VALUES (NEW.asin, 'add'); END;
+        CREATE TRIGGER IF NOT EXISTS wishlist_del AFTER DELETE ON wishlist
+            BEGIN INSERT INTO wishlist_modifiche (asin, op) VALUES (OLD.asin, 'remove'); END;
+    """
+
+    def __init__(self, path=LOCAL_WISHLIST_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(self.SCHEMA)
+        self._lock = threading.Lock()
+
+    def load_all(self):
+        with self._lock:
+            return {r[0] for r in self.conn.execute("SELECT asin FROM wishlist")}
+
+    def add_many(self, asins):
+        with self._lock, self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO wishlist (asin) VALUES (?)", [(a,) for a in asins])
+
+    def remove_many(self, asins):
+        with self._lock, self.conn:
+            self.conn.executemany("DELETE FROM wishlist WHERE asin = ?", [(a,) for a in asins])
+
+    def clear(self):
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM wishlist")
+
+    def changes_since(self, cursor):
+        """Ritorna (nuovo cursore, [(asin, op), ...]) dal registro delle modifiche."""
+        with self._lock:
+            if cursor is None:
+                seq = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM wishlist_modifiche").fetchone()[0]
+                return seq, {r[0] for r in self.conn.execute("SELECT asin FROM wishlist")}
+            righe = self.conn.execute(
+                "SELECT seq, asin, op FROM wishlist_modifiche WHERE seq > ? ORDER BY seq", (cursor,)
+            ).fetchall()
+        if not righe:
+            return cursor, []
+        return righe[-1][0], [(asin, op) for _, asin, op in righe]
+
+    def close(self):
+        self.conn.close()
+
+
+class WishlistSync:
+    def __init__(self, backend, flush_delay=1.0, batch_size=100, max_retries=5, refresh_interval=30.0,
+                 on_error=None):
+        self.backend = backend
+        self.flush_delay = flush_delay
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.refresh_interval = refresh_interval
+        self.on_error = on_error
+        self.ultimo_errore = None
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = False
+        self._dirty = set()          # ASIN toccati e non ancora sincronizzati
+        self._clear_pending = False
+        self._cursor = None
+        self._remoto = set()           # ciò che si crede sia nel backend
+        self.salvati = set()           # stato desiderato, condiviso dalle sessioni
+        self._ultimo_refresh = 0.0
+        # Primo caricamento: se il backend non risponde si parte vuoti e il thread riprova
+        self.caricato = False
+        self.refresh()
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # --- API USATA DALL'APP (nessuna chiamata di rete) ---
+    def snapshot(self):
+        """Copia dello stato corrente; ogni tanto la riallinea col backend."""
+        if time.monotonic() - self._ultimo_refresh > self.refresh_interval:
+            self._wake.set()
+        with self._lock:
+            return set(self.salvati)
+
+    def toggle(self, asin):
+        """Inverte lo stato di un ASIN e ritorna True se ora è salvato."""
+        with self._lock:
+            if asin in self.salvati:
+                self.salvati.discard(asin)
+                salvato = False
+            else:
+                self.salvati.add(asin)
+                salvato = True
+            self._dirty.add(asin)
+        self._wake.set()
+        return salvato
+
+    def clear(self):
+        with self._lock:
+            self.salvati.clear()
+            self._dirty.clear()
+            self._clear_pending = True
+        self._wake.set()
+
+    def pending(self):
+        with self._lock:
+            return len(self._dirty) + int(self._clear_pending)
+
+    # --- THREAD DI SINCRONIZZAZIONE ---
+    def _run(self):
+        while not self._stop:
+            # Finché il primo caricamento non riesce si riprova spesso
+            self._wake.wait(timeout=self.refresh_interval if self.caricato else self.flush_delay * 5)
+            self._wake.clear()
+            if self._stop: break
+            if not self.caricato:
+                self.refresh()
+                if not self.caricato: continue
+            # Breve attesa: i click ravvicinati finiscono nello stesso blocco
+            time.sleep(self.flush_delay)
+            self.flush()
+            if time.monotonic() - self._ultimo_refresh > self.refresh_interval:
+                self.refresh()
+
+    def _retry(self, azione, *args):
+        attesa = 0.5
+        for tentativo in range(1, self.max_retries + 1):
+            try:
+                azione(*args)
+                return True
+            except Exception as e:
+                self.ultimo_errore = f"{azione.__name__}: {e}"
+                if tentativo == self.max_retries:
+                    if self.on_error is not None:
+                        self.on_error(self.ultimo_errore)
+                    return False
+                time.sleep(attesa)
+                attesa *= 2
+        return False
+
+    def flush(self):
+        """Invia al backend le differenze tra stato desiderato e remoto, a blocchi."""
+        # Senza lo stato remoto iniziale le differenze sarebbero sbagliate: i click restano in sospeso
+        if not self.caricato: return
+        with self._lock:
+            svuota = self._clear_pending
+            self._clear_pending = False
+            dirty, self._dirty = self._dirty, set()
+            # Dopo lo svuotamento il backend è vuoto: ogni ASIN salvato dopo clear() va reinserito
+            remoto = set() if svuota else self._remoto
+            aggiunte = sorted(a for a in dirty if a in self.salvati and a not in remoto)
+            rimozioni = sorted(a for a in dirty if a not in self.salvati and a in remoto)
+
+        if svuota:
+            if self._retry(self.backend.clear):
+                with self._lock:
+                    self._remoto.clear()
+            else:
+                # Niente inserimenti prima dello svuotamento: verrebbero cancellati al prossimo giro
+                with self._lock:
+                    self._clear_pending = True
+                    self._dirty.update(dirty)
+                return
+
+        falliti = set()
+        for i in range(0, len(aggiunte), self.batch_size):
+            blocco = aggiunte[i:i + self.batch_size]
+            if self._retry(self.backend.add_many, blocco):
+                with self._lock: self._remoto.update(blocco)
+            else:
+                falliti.update(blocco)
+        for i in range(0, len(rimozioni), self.batch_size):
+            blocco = rimozioni[i:i + self.batch_size]
+            if self._retry(self.backend.remove_many, blocco):
+                with self._lock: self._remoto.difference_update(blocco)
+            else:
+                falliti.update(blocco)
+
+        if falliti:
+            # Restano in coda per il prossimo giro; il backend potrebbe essere cambiato
+            # (es. ASIN già inserito da un altro processo): si forza un riallineamento
+            with self._lock:
+                self._dirty.update(falliti)
+            self._ultimo_refresh = 0.0
+
+    def refresh(self):
+        """Riallinea lo stato con le modifiche fatte da altri processi, senza perdere quelle in sospeso."""
+        try:
+            cursor, modifiche = self.backend.changes_since(self._cursor)
+        except Exception as e:
+            self.ultimo_errore = f"refresh: {e}"
+            return
+        with self._lock:
+            if cursor is None or self._cursor is None:
+                remoto = set(modifiche)
+            else:
+                remoto = set(self._remoto)
+                for asin, op in modifiche:
+                    if op == 'add': remoto.add(asin)
+                    else: remoto.discard(asin)
+            self._cursor = cursor
+            self._remoto = remoto
+            self.caricato = True
+            if not self._clear_pending:
+                locali = {a for a in self._dirty if a in self.salvati}
+                tolti = {a for a in self._dirty if a not in self.salvati}
+                self.salvati = (remoto | locali) - tolti
+            self._ultimo_refresh = time.monotonic()
+
+    def close(self):
+        """Ferma il thread e invia le ultime modifiche."""
+        if self._stop: return
+        self._stop = True
+        self._wake.set()
+        self._thread.join(timeout=5)
+        self.flush()